@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 
 from flask import Blueprint, current_app, request, jsonify
-from flask.ext.login import login_user, current_user, logout_user
+from flask.ext.login import login_user, current_user, logout_user, login_required
 
 from ..user import User
+from ..settings.models import settings_cache
+from ..zones.status import FIELDS as ZONE_STATUS_FIELDS
+from ..decorators import admin_required
 
 
 api = Blueprint('api', __name__, url_prefix='/api')
@@ -31,3 +34,64 @@ def logout():
     if current_user.is_authenticated():
         logout_user()
     return jsonify(flag='success', msg='Logouted.')
+
+
+@api.route('/clients')
+@login_required
+@admin_required
+def clients():
+    return jsonify(clients=current_app.decoder.broadcast_stats())
+
+
+@api.route('/event_log/stats')
+@login_required
+@admin_required
+def event_log_stats():
+    return jsonify(current_app.decoder.event_log_stats())
+
+
+@api.route('/log/stats')
+@login_required
+@admin_required
+def log_stats():
+    return jsonify(current_app.log_queue.stats())
+
+
+@api.route('/settings/cache')
+@login_required
+@admin_required
+def settings_cache_stats():
+    return jsonify(settings_cache.stats())
+
+
+@api.route('/state')
+@login_required
+def state():
+    panel_state = current_app.decoder.state
+    snapshot = panel_state.snapshot()
+    etag = panel_state.etag(snapshot['version'])
+
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(snapshot)
+
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+@api.route('/zones/status')
+@login_required
+def zone_status():
+    table = current_app.decoder.zone_status
+    version, rows = table.rows(since=request.args.get('since', 0, type=int))
+
+    return jsonify(version=version, max_zones=table.max_zones, fields=ZONE_STATUS_FIELDS, zones=rows)
+
+
+@api.route('/messages/stats')
+@login_required
+@admin_required
+def message_stats():
+    return jsonify(current_app.decoder.message_stats())
@@ -15,6 +15,7 @@ from alarmdecoder import AlarmDecoder
 from alarmdecoder.devices import SerialDevice
 
 from .config import DefaultConfig
+from .logqueue import QueueHandler, JSONFormatter
 from .decoder import decodersocket, Decoder, create_decoder_socket
 from .user import User, user
 from .settings import settings
@@ -31,6 +32,7 @@ from .setup.constants import SETUP_COMPLETE, SETUP_STAGE_ENDPOINT, SETUP_ENDPOIN
 from .setup import setup
 from .updater import updater
 from .extensions import db, mail, cache, login_manager, oid
+from .database import configure_sqlite
 from .utils import INSTANCE_FOLDER_PATH
 
 
@@ -111,6 +113,9 @@ def configure_extensions(app):
     # flask-sqlalchemy
     db.init_app(app)
 
+    with app.app_context():
+        configure_sqlite(app, db.get_engine(app))
+
     # flask-mail
     mail.init_app(app)
 
@@ -170,13 +175,21 @@ def configure_logging(app):
         app.logger.setLevel(logging.INFO)
 
     info_log = os.path.join(app.config['LOG_FOLDER'], 'info.log')
-    info_file_handler = logging.handlers.RotatingFileHandler(info_log, maxBytes=100000, backupCount=10)
+    info_file_handler = logging.handlers.RotatingFileHandler(info_log, maxBytes=app.config['LOG_MAX_BYTES'], backupCount=app.config['LOG_BACKUP_COUNT'])
     info_file_handler.setLevel(logging.INFO)
-    info_file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s '
-        '[in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.addHandler(info_file_handler)
+    if app.config['LOG_JSON']:
+        info_file_handler.setFormatter(JSONFormatter())
+    else:
+        info_file_handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s: %(message)s '
+            '[in %(pathname)s:%(lineno)d]')
+        )
+
+    # File writes and rotations happen on the queue's writer thread.
+    queue_handler = QueueHandler(info_file_handler, max_pending=app.config['LOG_QUEUE_SIZE'])
+    queue_handler.setLevel(logging.INFO)
+    app.logger.addHandler(queue_handler)
+    app.log_queue = queue_handler
 
 
 def configure_hook(app):
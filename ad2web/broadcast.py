@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+
+import uuid
+from collections import deque
+
+import gevent
+from gevent.queue import Queue, Full, Empty
+from socketio import packet as socketio_packet
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+EVICT = 'evict'
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, EVICT)
+
+
+class Broadcaster(object):
+    """
+    Fans packets out to the connected websocket clients.  Each packet is
+    encoded once and handed to a bounded queue per session, which is drained
+    by its own greenlet so that a slow client only ever delays itself.
+
+    Clients may subscribe to the channels they're interested in, after which
+    they only receive those.  Clients that never subscribe receive everything.
+    Clients that asked for the compact encoding get their own variant of the
+    packet, encoded once for all of them.
+    """
+
+    def __init__(self, websocket, queue_size=100, policy=DROP_OLDEST, high_water=10):
+        """
+        Constructor
+
+        :param websocket: The websocket server holding the client sockets.
+        :type websocket: SocketIOServer
+        :param queue_size: Maximum number of packets queued per client.
+        :type queue_size: int
+        :param policy: What to do when a client queue is full: drop the
+                       oldest packet, drop the new packet or evict the client.
+        :type policy: string
+        :param high_water: Number of packets allowed to sit in the socket
+                           transport queue before we stop feeding it.
+        :type high_water: int
+        """
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown broadcast overflow policy: {0}'.format(policy))
+
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.policy = policy
+        self.high_water = high_water
+
+        self._clients = {}
+        self._topics = {}
+        self._subscriptions = {}
+        self._compact = set()
+
+    def publish(self, packet, sessions=None, compact=None):
+        """
+        Encodes a packet and queues it for delivery.
+
+        :param packet: SocketIO packet to send.
+        :type packet: dict
+        :param sessions: Session IDs to deliver to, or None for every client
+                         interested in the packet's channel.
+        :type sessions: list
+        :param compact: Callable building the packet for clients using the
+                        compact encoding, only called if there are any.
+        :type compact: callable
+        """
+        self._sync_clients()
+
+        if sessions is None:
+            listeners = self._topics.get(packet['name'], ())
+            clients = [c for s, c in self._clients.iteritems()
+                            if s in listeners or s not in self._subscriptions]
+        else:
+            clients = [self._clients[s] for s in sessions if s in self._clients]
+
+        if not clients:
+            return
+
+        if compact is not None and self._compact:
+            compact_clients = [c for c in clients if c.session in self._compact]
+            if compact_clients:
+                clients = [c for c in clients if c.session not in self._compact]
+                self._put(compact_clients, compact())
+
+        self._put(clients, packet)
+
+    def set_encoding(self, session, encoding):
+        """
+        Chooses the encoding used for a session.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param encoding: 'json' or 'compact'
+        :type encoding: string
+        """
+        if encoding == 'compact':
+            self._compact.add(session)
+        else:
+            self._compact.discard(session)
+
+    def subscribe(self, session, topics):
+        """
+        Subscribes a session to channels.  An empty list still opts the
+        session out of everything it hasn't subscribed to.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param topics: Channel names
+        :type topics: list
+        """
+        subscribed = self._subscriptions.setdefault(session, set())
+
+        for topic in topics:
+            subscribed.add(topic)
+            self._topics.setdefault(topic, set()).add(session)
+
+    def unsubscribe(self, session, topics=None):
+        """
+        Unsubscribes a session from channels.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param topics: Channel names, or None for all of them.
+        :type topics: list
+        """
+        subscribed = self._subscriptions.get(session)
+        if subscribed is None:
+            return
+
+        for topic in list(subscribed if topics is None else topics):
+            subscribed.discard(topic)
+
+            listeners = self._topics.get(topic)
+            if listeners is not None:
+                listeners.discard(session)
+                if not listeners:
+                    del self._topics[topic]
+
+    def wants(self, session, topic):
+        """
+        Whether a session receives the packets sent on a channel.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param topic: Channel name
+        :type topic: string
+        """
+        subscribed = self._subscriptions.get(session)
+
+        return subscribed is None or topic in subscribed
+
+    def stats(self):
+        """
+        Retrieves the queue statistics for each connected client.
+
+        :returns: A list of dictionaries, one per client.
+        """
+        self._sync_clients()
+
+        return [c.stats() for c in self._clients.itervalues()]
+
+    def stop(self):
+        """
+        Stops all of the client queues.
+        """
+        for client in self._clients.values():
+            client.stop()
+
+        self._clients = {}
+
+    def _sync_clients(self):
+        """
+        Creates queues for newly connected sessions and discards the queues of
+        sessions that have gone away.
+        """
+        sockets = self.websocket.sockets
+
+        for sessid in self._clients.keys():
+            if sessid not in sockets:
+                self._clients.pop(sessid).stop()
+
+        for sessid in self._subscriptions.keys():
+            if sessid not in sockets:
+                self.unsubscribe(sessid)
+                del self._subscriptions[sessid]
+
+        self._compact.intersection_update(sockets.keys())
+
+        for sessid, sock in sockets.iteritems():
+            if sessid not in self._clients:
+                self._clients[sessid] = ClientQueue(sock, self.queue_size, self.policy, self.high_water)
+
+    def _put(self, clients, packet):
+        if not clients:
+            return
+
+        message = socketio_packet.encode(packet)
+
+        for client in clients:
+            if not client.put(message):
+                self._evict(client)
+
+    def _evict(self, client):
+        """
+        Disconnects a client that can not keep up.
+
+        :param client: The lagging client queue.
+        :type client: ClientQueue
+        """
+        self._clients.pop(client.session, None)
+        client.stop()
+
+        try:
+            client.socket.kill()
+        except Exception:
+            pass
+
+
+class ReplayBuffer(object):
+    """
+    Numbers the packets broadcast to every client and keeps the most recent
+    ones, so that a client that lost its connection can be sent exactly what
+    it missed.  Sequence numbers restart with the process; the epoch tells a
+    client that the numbers it holds belong to an earlier run.
+    """
+
+    def __init__(self, size=500):
+        """
+        Constructor
+
+        :param size: Number of packets kept for replay.
+        :type size: int
+        """
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+
+        self._packets = deque(maxlen=size)
+
+    def sequence(self, packet):
+        """
+        Gives a packet the next sequence number, which is sent as its second
+        argument, and keeps it for replay.
+
+        :param packet: SocketIO event packet.
+        :type packet: dict
+        :returns: The numbered packet.
+        """
+        self.seq += 1
+        packet['args'] = [packet['args'], self.seq]
+
+        self._packets.append((self.seq, packet['name'], packet['args'][0]))
+
+        return packet
+
+    def since(self, epoch, seq):
+        """
+        Retrieves the packets sent after a sequence number.
+
+        :param epoch: Epoch the sequence number belongs to.
+        :type epoch: string
+        :param seq: Last sequence number the client received.
+        :type seq: int
+        :returns: A list of [seq, name, data] entries, or None if some of
+                  them are no longer available.
+        """
+        if epoch != self.epoch or seq > self.seq:
+            return None
+
+        if seq < self.seq and (not self._packets or self._packets[0][0] > seq + 1):
+            return None
+
+        return [list(p) for p in self._packets if p[0] > seq]
+
+
+class ClientQueue(object):
+    """
+    Bounded send queue for a single websocket session.
+    """
+
+    POLL_INTERVAL = 0.05
+    """Sleep time while waiting for the socket transport to drain."""
+
+    def __init__(self, sock, size, policy, high_water):
+        """
+        Constructor
+
+        :param sock: The websocket session.
+        :type sock: socketio.virtsocket.Socket
+        :param size: Maximum number of queued packets.
+        :type size: int
+        :param policy: Overflow policy.
+        :type policy: string
+        :param high_water: Transport queue depth at which we hold back.
+        :type high_water: int
+        """
+        self.socket = sock
+        self.session = sock.sessid
+        self.policy = policy
+        self.high_water = high_water
+
+        self.sent = 0
+        self.dropped = 0
+
+        self._queue = Queue(maxsize=size)
+        self._greenlet = gevent.spawn(self._drain)
+
+    def put(self, message):
+        """
+        Queues an encoded packet, applying the overflow policy if the queue
+        is full.
+
+        :param message: Encoded SocketIO packet.
+        :type message: string
+        :returns: False if the client should be evicted.
+        """
+        try:
+            self._queue.put_nowait(message)
+
+        except Full:
+            if self.policy == EVICT:
+                return False
+
+            self.dropped += 1
+
+            if self.policy == DROP_OLDEST:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.put_nowait(message)
+                except (Empty, Full):
+                    pass
+
+        return True
+
+    def depth(self):
+        """
+        Number of packets waiting to reach the client, including the ones
+        already handed to the socket transport.
+        """
+        return self._queue.qsize() + self._transport_depth()
+
+    def stats(self):
+        """
+        Queue statistics for this client.
+        """
+        return {
+            'session': self.session,
+            'depth': self.depth(),
+            'queued': self._queue.qsize(),
+            'transport': self._transport_depth(),
+            'sent': self.sent,
+            'dropped': self.dropped,
+        }
+
+    def stop(self):
+        """
+        Stops the drain greenlet.
+        """
+        self._greenlet.kill(block=False)
+
+    def _transport_depth(self):
+        client_queue = getattr(self.socket, 'client_queue', None)
+
+        return client_queue.qsize() if client_queue is not None else 0
+
+    def _drain(self):
+        """
+        Moves queued packets into the socket transport, holding back while
+        the client is still working through what it already has.
+        """
+        while True:
+            message = self._queue.get()
+
+            while self.socket.connected and self._transport_depth() >= self.high_water:
+                gevent.sleep(self.POLL_INTERVAL)
+
+            if not self.socket.connected:
+                continue
+
+            self.socket.put_client_msg(message)
+            self.sent += 1
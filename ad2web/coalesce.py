@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import time
+from collections import OrderedDict
+
+import gevent
+
+
+def coalesce_key(ftype, message):
+    """
+    Works out which earlier message a new one supersedes: the keypad address
+    mask for panel messages, the sensor for RF messages and the channel for
+    expander messages.  LRR messages each report an event and never
+    supersede one another.
+
+    :param ftype: Human-readable message type
+    :type ftype: string
+    :param message: The message
+    :type message: BaseMessage
+    :returns: The key, or None if the message can't be merged.
+    """
+    if ftype == 'panel':
+        return (ftype, getattr(message, 'mask', None))
+    elif ftype == 'rfx':
+        return getattr(message, 'serial_number', None)
+    elif ftype == 'exp':
+        return (getattr(message, 'address', None), getattr(message, 'channel', None))
+
+    return None
+
+
+class MessageStream(object):
+    """
+    Coalescing state and counters for one message type.
+    """
+
+    def __init__(self, ftype):
+        self.ftype = ftype
+
+        self.received = 0
+        self.sent = 0
+        self.suppressed = 0
+        self.merged = 0
+        self.heartbeats = 0
+        self.sent_bytes = 0
+        self.heartbeat_bytes = 0
+
+        self.last = {}
+        self.pending = None
+        self.timer = None
+        self.repeats = 0
+        self.last_sent = 0
+
+    def stats(self):
+        """
+        Counters for this message type, with an estimate of the bytes not
+        sent to each client.
+        """
+        average = float(self.sent_bytes) / self.sent if self.sent else 0
+
+        return {
+            'received': self.received,
+            'sent': self.sent,
+            'suppressed': self.suppressed,
+            'merged': self.merged,
+            'heartbeats': self.heartbeats,
+            'sent_bytes': self.sent_bytes,
+            'heartbeat_bytes': self.heartbeat_bytes,
+            'saved_bytes': max(0, int((self.suppressed + self.merged) * average) - self.heartbeat_bytes),
+        }
+
+
+class MessageCoalescer(object):
+    """
+    Thins out the raw message stream before it's broadcast.  A message that's
+    byte for byte the last one sent for its keypad, sensor or channel is
+    dropped, with a small heartbeat going out now and then in its place.
+    Once a message is sent, any others for the same key arriving within the
+    window are held back and only the latest of them is sent when it closes.
+    """
+
+    def __init__(self, send, window=0.25, heartbeat=30):
+        """
+        Constructor
+
+        :param send: Callable sending a message, called with the message type,
+                     the message and the number of repeats for a heartbeat.
+                     Returns the number of bytes it sent.
+        :type send: callable
+        :param window: Time in seconds bursts are merged over, 0 to send
+                       every changed message straight away.
+        :type window: float
+        :param heartbeat: Minimum time in seconds between heartbeats, 0 for
+                          none at all.
+        :type heartbeat: float
+        """
+        self.window = window
+        self.heartbeat = heartbeat
+
+        self._send = send
+        self._streams = {}
+
+    def add(self, ftype, message):
+        """
+        Takes a message from the device.
+
+        :param ftype: Human-readable message type
+        :type ftype: string
+        :param message: The message
+        :type message: BaseMessage
+        """
+        stream = self._streams.get(ftype)
+        if stream is None:
+            stream = self._streams[ftype] = MessageStream(ftype)
+
+        stream.received += 1
+        key = coalesce_key(ftype, message)
+
+        if stream.pending is not None and key is not None:
+            if key in stream.pending:
+                stream.merged += 1
+
+            stream.pending[key] = message
+            return
+
+        if key is not None and self._is_repeat(stream, key, message):
+            self._send_heartbeat(stream)
+            return
+
+        self._send_message(stream, key, message)
+
+        if self.window > 0 and key is not None:
+            self._open_window(stream)
+
+    def latest(self, ftype):
+        """
+        Retrieves the last messages sent of a type.
+
+        :param ftype: Human-readable message type
+        :type ftype: string
+        :returns: A list of messages.
+        """
+        stream = self._streams.get(ftype)
+
+        return [m for raw, m in stream.last.values()] if stream is not None else []
+
+    def stats(self):
+        """
+        Retrieves the counters for each message type.
+
+        :returns: A dictionary keyed by message type.
+        """
+        return dict((ftype, s.stats()) for ftype, s in self._streams.iteritems())
+
+    def stop(self):
+        """
+        Cancels any pending merges.
+        """
+        for stream in self._streams.values():
+            if stream.timer is not None:
+                stream.timer.kill(block=False)
+                stream.timer = None
+
+            stream.pending = None
+
+    def _open_window(self, stream):
+        stream.pending = OrderedDict()
+        stream.timer = gevent.spawn_later(self.window, self._close_window, stream)
+
+    def _close_window(self, stream):
+        pending, stream.pending, stream.timer = stream.pending, None, None
+
+        sent = False
+        for key, message in pending.iteritems():
+            if self._is_repeat(stream, key, message):
+                continue
+
+            self._send_message(stream, key, message)
+            sent = True
+
+        # Keep merging for as long as the burst lasts.
+        if sent:
+            self._open_window(stream)
+        elif pending:
+            self._send_heartbeat(stream)
+
+    def _is_repeat(self, stream, key, message):
+        last = stream.last.get(key)
+        if last is None or last[0] != message.raw:
+            return False
+
+        stream.suppressed += 1
+        stream.repeats += 1
+        return True
+
+    def _send_message(self, stream, key, message):
+        stream.last[key] = (message.raw, message)
+        stream.last_sent = time.time()
+        stream.repeats = 0
+
+        stream.sent += 1
+        stream.sent_bytes += self._send(stream.ftype, message) or 0
+
+    def _send_heartbeat(self, stream):
+        if not self.heartbeat or time.time() - stream.last_sent < self.heartbeat:
+            return
+
+        stream.last_sent = time.time()
+        stream.heartbeats += 1
+        stream.heartbeat_bytes += self._send(stream.ftype, None, repeats=stream.repeats) or 0
+        stream.repeats = 0
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+    SQLite connection tuning.
+"""
+
+from sqlalchemy import event
+
+# Pragma name and the config key holding its value.
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+)
+
+
+def sqlite_pragmas(config):
+    """
+    Builds the list of pragmas to apply from the application config.  Pragmas
+    whose setting is missing or None are left at the SQLite default.
+    """
+    return [(pragma, config[key]) for pragma, key in SQLITE_PRAGMAS if config.get(key) is not None]
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """
+    Applies pragmas to a raw DBAPI connection.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in pragmas:
+            cursor.execute('PRAGMA {0}={1}'.format(pragma, value))
+    finally:
+        cursor.close()
+
+
+def configure_sqlite(app, engine):
+    """
+    Applies the configured pragmas to every new connection made by the
+    engine.  Does nothing for other databases.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
@@ -3,6 +3,8 @@
 import os
 import sys
 import time
+import uuid
+import itertools
 import traceback
 import threading
 
@@ -13,7 +15,7 @@ from socketio.server import SocketIOServer
 from socketioflaskdebug.debugger import SocketIODebugger
 
 from flask import Blueprint, Response, request, g, current_app
-import jsonpickle
+from flask.ext.login import current_user
 
 from OpenSSL import SSL
 from alarmdecoder import AlarmDecoder
@@ -21,7 +23,17 @@ from alarmdecoder.devices import SocketDevice, SerialDevice
 from alarmdecoder.util import NoDeviceError, CommError
 
 from .extensions import db
+from .broadcast import Broadcaster, ReplayBuffer
+from . import serializers
+from .coalesce import MessageCoalescer
+from .state import PanelState
+from .zones.status import ZoneStatusTable, FIELDS as ZONE_STATUS_FIELDS
+from .zones.constants import MAX_ZONES
 from .notifications import NotificationSystem
+from .log.writer import EventLogWriter
+from .log.retention import EventLogRetention
+from .log.live import LogTail
+from .log.search import create_index as create_search_index
 from .settings.models import Setting
 from .certificate.models import Certificate
 from .updater import Updater
@@ -78,17 +90,41 @@ class Decoder(object):
             self.updater = Updater()
             self.updates = {}
             self.version = ''
+            self.state = PanelState()
+            self.zone_status = ZoneStatusTable(MAX_ZONES)
 
             self.trigger_reopen_device = False
             self.trigger_restart = False
 
             self._last_message = None
+            # Events are numbered as they arrive; the epoch keeps the ids
+            # unique in the notification outbox across restarts.
+            self._event_epoch = uuid.uuid4().hex[:8]
+            self._event_ids = itertools.count(1)
             self._device_baudrate = 115200
             self._device_type = None
             self._device_location = None
             self._event_thread = DecoderThread(self)
             self._version_thread = VersionChecker(self)
+            self._event_log_writer = EventLogWriter(app,
+                                                    interval=app.config['EVENT_LOG_FLUSH_INTERVAL'],
+                                                    batch_size=app.config['EVENT_LOG_FLUSH_ROWS'])
+            self._event_log_retention = EventLogRetention(app,
+                                                    interval=app.config['EVENT_LOG_RETENTION_INTERVAL'],
+                                                    max_age=app.config['EVENT_LOG_MAX_AGE'],
+                                                    max_rows=app.config['EVENT_LOG_MAX_ROWS'],
+                                                    archive_folder=app.config['EVENT_LOG_ARCHIVE_FOLDER'],
+                                                    chunk_size=app.config['EVENT_LOG_DELETE_CHUNK'])
+            self._log_tail = LogTail(self, os.path.join(app.config['LOG_FOLDER'], 'info.log'),
+                                        backlog=app.config['LOG_TAIL_BACKLOG'])
             self._notifier_system = None
+            self._broadcaster = Broadcaster(websocket,
+                                            queue_size=app.config['BROADCAST_QUEUE_SIZE'],
+                                            policy=app.config['BROADCAST_OVERFLOW_POLICY'])
+            self._replay = ReplayBuffer(size=app.config['BROADCAST_REPLAY_SIZE'])
+            self._coalescer = MessageCoalescer(self._send_message,
+                                               window=app.config['MESSAGE_COALESCE_WINDOW'],
+                                               heartbeat=app.config['MESSAGE_HEARTBEAT_INTERVAL'])
 
     def start(self):
         """
@@ -96,6 +132,9 @@ class Decoder(object):
         """
         self._event_thread.start()
         self._version_thread.start()
+        self._event_log_writer.start()
+        self._event_log_retention.start()
+        self._log_tail.start()
 
     def stop(self, restart=False):
         """
@@ -112,6 +151,13 @@ class Decoder(object):
         self._event_thread.stop()
         self._version_thread.stop()
 
+        if self._notifier_system:
+            self._notifier_system.stop()
+
+        self._event_log_retention.stop()
+        self._event_log_writer.stop()
+        self._log_tail.stop()
+
         if restart:
             try:
                 self._event_thread.join(5)
@@ -119,10 +165,16 @@ class Decoder(object):
             except RuntimeError:
                 pass
 
+        self._coalescer.stop()
+        self._broadcaster.stop()
         self.websocket.stop()
 
         if restart:
             self.app.logger.info('Restarting service..')
+
+            # execv skips the interpreter's shutdown, so write out the queued
+            # log records first.
+            self.app.log_queue.close()
             os.execv(sys.executable, [sys.executable] + sys.argv)
 
     def init(self):
@@ -154,10 +206,16 @@ class Decoder(object):
             else:
                 current_app.logger.debug('Database is good!!!!!!')
 
+            if not create_search_index(db.engine):
+                current_app.logger.info('Full-text search unavailable, falling back to scanning the event log.')
+
             if device_type:
                 self.trigger_reopen_device = True
 
-            self._notifier_system = NotificationSystem()
+            if self._notifier_system:
+                self._notifier_system.stop()
+
+            self._notifier_system = NotificationSystem(self._event_log_writer)
 
     def open(self):
         """
@@ -245,6 +303,12 @@ class Decoder(object):
     def test_notifier(self, id):
         return self._notifier_system.test_notifier(id)
 
+    def refresh_messages(self):
+        self._notifier_system.refresh_messages()
+
+    def refresh_zones(self):
+        self._notifier_system.refresh_zones()
+
     def _on_device_open(self, sender):
         """
         Internal event handler for when the device opens.
@@ -254,6 +318,7 @@ class Decoder(object):
         """
         self.app.logger.info('AlarmDecoder device was opened.')
 
+        self.state.set_connected(True)
         self.broadcast('device_open')
         self.trigger_reopen_device = False
 
@@ -266,6 +331,8 @@ class Decoder(object):
         """
         self.app.logger.info('AlarmDecoder device was closed.')
 
+        self.state.reset()
+        self._broadcast_zone_status(self.zone_status.clear())
         self.broadcast('device_close')
         self.trigger_reopen_device = True
 
@@ -283,7 +350,38 @@ class Decoder(object):
         :type kwargs: dict
         """
         try:
-            self.broadcast('message', { 'message': kwargs.get('message', None), 'message_type': ftype } )
+            message = kwargs.get('message', None)
+            if message is None:
+                return
+
+            if ftype == 'panel':
+                self.state.update_message(message)
+
+            self._coalescer.add(ftype, message)
+
+        except Exception, err:
+            self.app.logger.error('Error while broadcasting message.', exc_info=True)
+
+    def _send_message(self, ftype, message, repeats=None, sessions=None):
+        """
+        Broadcasts a device message, or a heartbeat standing in for repeats
+        of the last one.
+
+        :param ftype: Human-readable message type
+        :type ftype: string
+        :param message: The message, or None for a heartbeat.
+        :type message: BaseMessage
+        :param repeats: Number of repeats the heartbeat stands in for.
+        :type repeats: int
+        :param sessions: Session IDs to send to, or None for every client.
+        :type sessions: list
+        :returns: The size of the encoded message.
+        """
+        try:
+            if message is None:
+                return self.broadcast('message', { 'message_type': ftype, 'heartbeat': True, 'repeats': repeats })
+
+            return self.broadcast('message', { 'message': message, 'message_type': ftype }, sessions=sessions)
 
         except Exception, err:
             self.app.logger.error('Error while broadcasting message.', exc_info=True)
@@ -303,40 +401,200 @@ class Decoder(object):
         """
         try:
             self._last_message = time.time()
+            event_id = '{0}:{1}'.format(self._event_epoch, next(self._event_ids))
+
+            self.state.update_event(ftype, **kwargs)
+            self.broadcast('event', kwargs)
+
+            if ftype == ZONE_FAULT:
+                self._broadcast_zone_status(self.zone_status.fault(kwargs.get('zone')))
+            elif ftype == ZONE_RESTORE:
+                self._broadcast_zone_status(self.zone_status.restore(kwargs.get('zone')))
 
             with self.app.app_context():
-                errors = self._notifier_system.send(ftype, **kwargs)
+                errors = self._notifier_system.send(ftype, event_id=event_id, **kwargs)
                 for e in errors:
                     self.app.logger.error(e)
 
-            self.broadcast('event', kwargs)
-
         except Exception, err:
             self.app.logger.error('Error while broadcasting event.', exc_info=True)
 
-    def broadcast(self, channel, data={}):
+    def broadcast(self, channel, data={}, sessions=None):
         """
-        Broadcasts a message to all of the connected websocket clients.
+        Broadcasts a message to the connected websocket clients.
 
         :param channel: Websocket channel
         :type channel: string
         :param data: Data to send over the websocket.
         :type data: dict
+        :param sessions: Session IDs to send to, or None for every client.
+                         Only packets sent to every client are numbered and
+                         can be replayed.
+        :type sessions: list
+        :returns: The size of the encoded data.
         """
-        obj = jsonpickle.encode(data, unpicklable=False)
+        obj = serializers.encode(data)
         packet = self._make_packet(channel, obj)
 
-        self._broadcast_packet(packet)
+        if sessions is None:
+            self._replay.sequence(packet)
+
+        def compact():
+            args = [serializers.compact(channel, data)]
+            if sessions is None:
+                args.append(packet['args'][1])
+
+            return dict(packet, args=args)
+
+        self._broadcast_packet(packet, sessions=sessions, compact=compact)
+
+        return len(obj)
+
+    def resume(self, session, epoch=None, seq=None):
+        """
+        Catches a reconnected client up.  The packets it missed are sent in a
+        single 'resume' reply, or a snapshot of the panel and zone state if
+        they're no longer available.  Clients without a sequence number get
+        the current one and the last keypad message, which the panel may not
+        change for a while.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param epoch: Epoch the client's sequence number belongs to.
+        :type epoch: string
+        :param seq: Last sequence number the client received.
+        :type seq: int
+        """
+        reply = {'epoch': self._replay.epoch, 'seq': self._replay.seq}
+
+        if seq is None:
+            if self._broadcaster.wants(session, 'message'):
+                for message in self._coalescer.latest('panel'):
+                    self._send_message('panel', message, sessions=[session])
+
+        else:
+            packets = self._replay.since(epoch, seq)
+            if packets is not None:
+                reply['packets'] = [p for p in packets if self._broadcaster.wants(session, p[1])]
+            else:
+                reply['snapshot'] = self.snapshot()
+
+        self.broadcast('resume', reply, sessions=[session])
+
+    def snapshot(self):
+        """
+        Retrieves the current panel and zone state.
+
+        :returns: A dictionary with the panel state and the zone status rows.
+        """
+        version, rows = self.zone_status.rows()
+
+        return {
+            'state': self.state.snapshot(),
+            'zones': {'version': version, 'fields': ZONE_STATUS_FIELDS, 'zones': rows},
+        }
+
+    def event_log_stats(self):
+        """
+        Retrieves the event log writer flush statistics.
+
+        :returns: A dictionary of batch size and latency metrics.
+        """
+        return self._event_log_writer.stats()
+
+    def message_stats(self):
+        """
+        Retrieves the message coalescing counters.
+
+        :returns: A dictionary of counters for each message type.
+        """
+        return self._coalescer.stats()
+
+    def broadcast_stats(self):
+        """
+        Retrieves the send queue statistics for each websocket client.
+
+        :returns: A list of dictionaries, one per client.
+        """
+        return self._broadcaster.stats()
+
+    def set_encoding(self, session, encoding):
+        """
+        Chooses the encoding of the packets sent to a websocket session.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param encoding: 'json' or 'compact'
+        :type encoding: string
+        """
+        self._broadcaster.set_encoding(session, encoding)
+
+    def subscribe(self, session, topics):
+        """
+        Limits the broadcasts a websocket session receives to a set of
+        channels.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param topics: Channel names
+        :type topics: list
+        """
+        self._broadcaster.subscribe(session, topics)
+
+    def unsubscribe(self, session, topics=None):
+        """
+        Stops sending channels to a websocket session.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param topics: Channel names, or None for all of them.
+        :type topics: list
+        """
+        self._broadcaster.unsubscribe(session, topics)
 
-    def _broadcast_packet(self, packet):
+    def subscribe_log(self, session, lines=None):
         """
-        Broadcasts the packet to all websocket clients.
+        Subscribes a websocket session to the live application log.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param lines: Number of backlog lines to send.
+        :type lines: int
+        """
+        self._log_tail.subscribe(session, lines)
+
+    def unsubscribe_log(self, session):
+        """
+        Unsubscribes a websocket session from the live application log.
+
+        :param session: Websocket session ID
+        :type session: string
+        """
+        self._log_tail.unsubscribe(session)
+
+    def _broadcast_zone_status(self, diff):
+        """
+        Sends a zone status table diff to the websocket clients.
+
+        :param diff: Diff returned by the zone status table, or None.
+        :type diff: dict
+        """
+        if diff is not None:
+            self.broadcast('zone_status', diff)
+
+    def _broadcast_packet(self, packet, sessions=None, compact=None):
+        """
+        Broadcasts the packet to the websocket clients.
 
         :param packet: SocketIO packet to send.
         :type packet: dict
+        :param sessions: Session IDs to send to, or None for every client.
+        :type sessions: list
+        :param compact: Callable building the packet for clients using the
+                        compact encoding.
+        :type compact: callable
         """
-        for session, sock in self.websocket.sockets.iteritems():
-            sock.send_packet(packet)
+        self._broadcaster.publish(packet, sessions=sessions, compact=compact)
 
     def _make_packet(self, channel, data):
         """
@@ -481,6 +739,99 @@ class DecoderNamespace(BaseNamespace, BroadcastMixin):
             except (CommError, AttributeError), err:
                 self._alarmdecoder.app.logger.error('Error sending keypress to device', exc_info=True)
 
+    def on_resume(self, epoch=None, seq=None):
+        """
+        Handles a client asking for the packets it missed while it was
+        disconnected.
+
+        :param epoch: Epoch the client's sequence number belongs to.
+        :type epoch: string
+        :param seq: Last sequence number the client received.
+        :type seq: int
+        """
+        try:
+            seq = int(seq) if seq is not None else None
+        except ValueError:
+            seq = None
+
+        self._alarmdecoder.resume(self.socket.sessid, epoch, seq)
+
+    def on_encoding(self, encoding):
+        """
+        Handles a client choosing how the packets sent to it are encoded.
+
+        :param encoding: 'json' or 'compact'
+        :type encoding: string
+        """
+        if encoding in serializers.ENCODINGS:
+            self._alarmdecoder.set_encoding(self.socket.sessid, encoding)
+
+    def on_subscribe(self, topics):
+        """
+        Handles a client choosing the channels it wants to receive.  Until
+        it does, it receives all of them.
+
+        :param topics: Channel name or list of names.
+        :type topics: string or list
+        """
+        self._alarmdecoder.subscribe(self.socket.sessid, self._topics(topics))
+
+    def on_unsubscribe(self, topics=None):
+        """
+        Handles a client dropping channels it no longer wants.
+
+        :param topics: Channel name or list of names, None for all of them.
+        :type topics: string or list
+        """
+        if topics is not None:
+            topics = self._topics(topics)
+
+        self._alarmdecoder.unsubscribe(self.socket.sessid, topics)
+
+    def on_log_subscribe(self, lines=None):
+        """
+        Subscribes this client to the live application log.  Admin only.
+
+        :param lines: Number of backlog lines to send.
+        :type lines: int
+        """
+        if not self._is_admin():
+            return
+
+        try:
+            lines = int(lines) if lines is not None else None
+        except ValueError:
+            lines = None
+
+        self._alarmdecoder.subscribe_log(self.socket.sessid, lines)
+
+    def on_log_unsubscribe(self):
+        """
+        Unsubscribes this client from the live application log.
+        """
+        self._alarmdecoder.unsubscribe_log(self.socket.sessid)
+
+    def recv_disconnect(self):
+        """
+        Handles client disconnects.
+        """
+        self._alarmdecoder.unsubscribe_log(self.socket.sessid)
+
+        BaseNamespace.recv_disconnect(self)
+
+    def _topics(self, topics):
+        if isinstance(topics, basestring):
+            topics = [topics]
+
+        return [t for t in topics or [] if isinstance(t, basestring)]
+
+    def _is_admin(self):
+        """
+        Checks the logged in user from the session the socket was opened with.
+        """
+        with self._alarmdecoder.app.request_context(self.environ):
+            return current_user.is_authenticated() and current_user.is_admin()
+
     def on_test(self, *args):
         """
         Handles test start events.
@@ -1,6 +1,31 @@
 # -*- coding: utf-8 -*-
 
-from flask.ext.sqlalchemy import SQLAlchemy
+from flask.ext.sqlalchemy import SQLAlchemy as BaseSQLAlchemy
+from sqlalchemy.pool import QueuePool
+
+class SQLAlchemy(BaseSQLAlchemy):
+    def apply_driver_hacks(self, app, info, options):
+        rv = BaseSQLAlchemy.apply_driver_hacks(self, app, info, options)
+
+        if not info.drivername.startswith('sqlite'):
+            return rv
+
+        # File-backed SQLite gets a NullPool by default, which reconnects (and
+        # re-applies every pragma) on each checkout.  Use a real pool when a
+        # size has been configured.
+        if info.database not in (None, '', ':memory:') and options.get('pool_size'):
+            options['poolclass'] = QueuePool
+            options.setdefault('connect_args', {})['check_same_thread'] = False
+
+        # In-memory and NullPool databases use pools that reject the sizing
+        # arguments inherited from DefaultConfig.
+        if options.get('poolclass') is not QueuePool:
+            options.pop('pool_size', None)
+            options.pop('pool_timeout', None)
+            options.pop('max_overflow', None)
+
+        return rv
+
 db = SQLAlchemy()
 
 from flask.ext.mail import Mail
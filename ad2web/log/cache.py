@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+from ..extensions import db
+from .models import EventLogEntry
+
+
+class EventLogCounts(object):
+    """
+    Keeps the event log row counts in memory so that paging doesn't need a
+    full table count on every request.  The total is loaded once and then
+    maintained as entries are written.  Filtered counts are cached per
+    filter along with the highest row id they cover, so a refresh only has
+    to count the rows added since.
+    """
+
+    MAX_FILTERS = 32
+    """Number of filtered counts to keep."""
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._lock = threading.Lock()
+        self._total = None
+        self._filtered = OrderedDict()
+
+    def total(self):
+        """
+        Retrieves the number of rows in the event log.
+        """
+        if self._total is None:
+            total = EventLogEntry.query.count()
+
+            with self._lock:
+                if self._total is None:
+                    self._total = total
+
+        return self._total
+
+    def filtered(self, key, criteria, last_id):
+        """
+        Retrieves the number of rows matching a filter.
+
+        :param key: Hashable identifier for the filter.
+        :type key: tuple
+        :param criteria: Filter expressions for the query.
+        :type criteria: list
+        :param last_id: Highest row id to count up to.
+        :type last_id: int
+        """
+        with self._lock:
+            cached = self._filtered.pop(key, None)
+
+        if cached is None:
+            count = EventLogEntry.query.filter(EventLogEntry.id <= last_id, *criteria).count()
+        else:
+            count, since = cached
+            if last_id > since:
+                count += EventLogEntry.query.filter(EventLogEntry.id > since, EventLogEntry.id <= last_id, *criteria).count()
+
+        with self._lock:
+            self._filtered[key] = (count, last_id)
+            while len(self._filtered) > self.MAX_FILTERS:
+                self._filtered.popitem(last=False)
+
+        return count
+
+    def last_id(self):
+        """
+        Retrieves the highest row id in the event log.
+        """
+        return db.session.query(db.func.max(EventLogEntry.id)).scalar() or 0
+
+    def inserted(self, count):
+        """
+        Records newly written rows.
+
+        :param count: Number of rows written.
+        :type count: int
+        """
+        with self._lock:
+            if self._total is not None:
+                self._total += count
+
+    def reset(self):
+        """
+        Drops the cached counts.  Called whenever rows are removed.
+        """
+        with self._lock:
+            self._total = None
+            self._filtered.clear()
+
+
+class PageCursors(object):
+    """
+    Remembers the last row of each page served so that the following page
+    can be fetched with a keyset query instead of an offset.  Cursors are
+    keyed by the filter, the highest row id at the time and the row offset
+    they lead to, so new rows simply make the old ones unreachable.
+    """
+
+    MAX_CURSORS = 1024
+    """Number of cursors to keep."""
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._lock = threading.Lock()
+        self._cursors = OrderedDict()
+
+    def get(self, key, last_id, start):
+        """
+        Retrieves the cursor leading to a row offset.
+
+        :param key: Hashable identifier for the filter.
+        :type key: tuple
+        :param last_id: Highest row id when the page was requested.
+        :type last_id: int
+        :param start: Row offset
+        :type start: int
+        :returns: (timestamp, id) of the row preceding the offset or None.
+        """
+        with self._lock:
+            return self._cursors.get((key, last_id, start))
+
+    def set(self, key, last_id, start, cursor):
+        """
+        Stores the cursor leading to a row offset.
+
+        :param key: Hashable identifier for the filter.
+        :type key: tuple
+        :param last_id: Highest row id when the page was requested.
+        :type last_id: int
+        :param start: Row offset
+        :type start: int
+        :param cursor: (timestamp, id) of the row preceding the offset.
+        :type cursor: tuple
+        """
+        with self._lock:
+            self._cursors[(key, last_id, start)] = cursor
+            while len(self._cursors) > self.MAX_CURSORS:
+                self._cursors.popitem(last=False)
+
+    def reset(self):
+        """
+        Drops all of the cursors.  Called whenever rows are removed.
+        """
+        with self._lock:
+            self._cursors.clear()
+
+
+counts = EventLogCounts()
+cursors = PageCursors()
+
+
+def invalidate():
+    """
+    Drops all cached counts and cursors after rows have been removed from
+    the event log.
+    """
+    counts.reset()
+    cursors.reset()
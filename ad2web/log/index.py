@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+# Matches the start of an entry written by the application log formatter,
+# capturing the minute it falls in and its level.  Lines that don't match
+# continue the previous entry (tracebacks and the like).
+ENTRY_RE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d):\d\d,\d{3} ([A-Z]+):')
+
+LEVELS = {
+    'DEBUG': 1,
+    'INFO': 2,
+    'WARNING': 4,
+    'ERROR': 8,
+    'CRITICAL': 16,
+}
+ALL_LEVELS = sum(LEVELS.values())
+
+
+def level_mask(level):
+    """
+    Builds the mask matching a level and everything more severe.
+
+    :param level: Level name, or None for all levels.
+    :type level: string
+    """
+    if level is None:
+        return ALL_LEVELS
+
+    bit = LEVELS[level.upper()]
+    return sum(b for b in LEVELS.values() if b >= bit)
+
+
+class FileIndex(object):
+    """
+    Index of a single log file: the byte offset where each minute starts
+    and which levels appear within it.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.offsets = []
+        self.masks = []
+        self.size = 0
+
+    def update(self, f):
+        """
+        Indexes everything written since the last update.  A trailing line
+        that hasn't been completed yet is left for the next one.
+
+        :param f: The log file, opened in binary mode.
+        :type f: file
+        """
+        f.seek(self.size)
+        offset = self.size
+
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+
+            match = ENTRY_RE.match(line.decode('utf-8', 'replace'))
+            if match is not None:
+                key, level = match.groups()
+                bit = LEVELS.get(level, 0)
+
+                if not self.keys or self.keys[-1] != key:
+                    self.keys.append(key)
+                    self.offsets.append(offset)
+                    self.masks.append(bit)
+                else:
+                    self.masks[-1] |= bit
+
+            offset += len(line)
+
+        self.size = offset
+
+    def ranges(self, since=None, until=None, mask=ALL_LEVELS):
+        """
+        Works out the byte ranges holding entries within a time range and
+        matching the level mask.
+
+        :param since: First minute to include, as 'YYYY-MM-DD HH:MM'.
+        :type since: string
+        :param until: Last minute to include, as 'YYYY-MM-DD HH:MM'.
+        :type until: string
+        :param mask: Level mask from level_mask()
+        :type mask: int
+        :returns: A list of (start, end) byte offsets.
+        """
+        first = bisect_left(self.keys, since) if since else 0
+        last = bisect_right(self.keys, until) if until else len(self.keys)
+
+        ranges = []
+        for i in range(first, last):
+            if not self.masks[i] & mask:
+                continue
+
+            start = self.offsets[i]
+            end = self.offsets[i + 1] if i + 1 < len(self.offsets) else self.size
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+
+        return ranges
+
+
+class LogIndex(object):
+    """
+    Time and level index over a log file and its rotated copies.  Files are
+    tracked by inode, so a rotation just renames an index instead of
+    rebuilding it, and the live file is only indexed from where we left off.
+    """
+
+    def __init__(self, path, backups=10):
+        """
+        Constructor
+
+        :param path: Path of the live log file.
+        :type path: string
+        :param backups: Number of rotated copies kept by the handler.
+        :type backups: int
+        """
+        self.path = path
+        self.backups = backups
+
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Brings the index up to date with the files on disk.
+
+        :returns: A list of (path, FileIndex), oldest file first.
+        """
+        with self._lock:
+            found = []
+            files = {}
+
+            for name in self._names():
+                try:
+                    st = os.stat(name)
+                except OSError:
+                    continue
+
+                fid = (st.st_dev, st.st_ino)
+                index = self._files.get(fid)
+                if index is None or st.st_size < index.size:
+                    index = FileIndex()
+
+                if st.st_size > index.size:
+                    with open(name, 'rb') as f:
+                        index.update(f)
+
+                files[fid] = index
+                found.append((name, index))
+
+            self._files = files
+
+        found.reverse()
+        return found
+
+    def search(self, since=None, until=None, text=None, level=None, limit=500):
+        """
+        Finds log entries, reading only the regions of each file the index
+        says could match.
+
+        :param since: Earliest timestamp, as 'YYYY-MM-DD HH:MM[:SS]'.
+        :type since: string
+        :param until: Latest timestamp, as 'YYYY-MM-DD HH:MM[:SS]'.
+        :type until: string
+        :param text: Case insensitive substring the entry must contain.
+        :type text: string
+        :param level: Minimum level name.
+        :type level: string
+        :param limit: Maximum number of entries to return.
+        :type limit: int
+        :returns: The most recent matching entries, oldest first, and
+                  whether older matches were left out.
+        """
+        mask = level_mask(level)
+        text = text.lower() if text else None
+        # Entries up to the end of the last second asked for.
+        until_key = until + ':99' if until and len(until) == 16 else until
+
+        results = deque(maxlen=limit)
+        matched = 0
+
+        for name, index in self.refresh():
+            ranges = index.ranges(since[:16] if since else None, until[:16] if until else None, mask)
+            if not ranges:
+                continue
+
+            with open(name, 'rb') as f:
+                for start, end in ranges:
+                    f.seek(start)
+                    data = f.read(end - start).decode('utf-8', 'replace')
+
+                    for entry, timestamp, bit in self._entries(data):
+                        if not bit & mask:
+                            continue
+                        if since and timestamp < since:
+                            continue
+                        if until_key and timestamp > until_key:
+                            continue
+                        if text and text not in entry.lower():
+                            continue
+
+                        results.append(entry)
+                        matched += 1
+
+        return list(results), matched > len(results)
+
+    def _entries(self, data):
+        entry = []
+        timestamp = None
+        bit = 0
+
+        for line in data.splitlines():
+            match = ENTRY_RE.match(line)
+            if match is not None:
+                if entry:
+                    yield '\n'.join(entry), timestamp, bit
+
+                entry = [line]
+                timestamp = line[:19]
+                bit = LEVELS.get(match.group(2), 0)
+            elif entry:
+                entry.append(line)
+
+        if entry:
+            yield '\n'.join(entry), timestamp, bit
+
+    def _names(self):
+        return [self.path] + ['{0}.{1}'.format(self.path, i) for i in range(1, self.backups + 1)]
+
+
+_indexes = {}
+
+
+def get_index(path, backups=10):
+    """
+    Retrieves the shared index for a log file.
+
+    :param path: Path of the live log file.
+    :type path: string
+    :param backups: Number of rotated copies kept by the handler.
+    :type backups: int
+    """
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes.setdefault(path, LogIndex(path, backups))
+
+    return index
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+from collections import deque
+
+from ..logwatch import LogWatcher
+
+
+class LogTail(threading.Thread):
+    """
+    Follows the application log and pushes new lines to the websocket
+    clients subscribed to the 'log' channel.  A single watcher is shared by
+    every subscriber and the most recent lines are kept in memory to give
+    new subscribers a backlog.
+    """
+
+    def __init__(self, decoder, path, backlog=200):
+        """
+        Constructor
+
+        :param decoder: Parent decoder object
+        :type decoder: Decoder
+        :param path: Path of the log file to follow.
+        :type path: string
+        :param backlog: Number of recent lines kept for new subscribers.
+        :type backlog: int
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = os.path.realpath(path)
+
+        self._decoder = decoder
+        self._backlog = deque(maxlen=backlog)
+        self._subscribers = set()
+        self._watcher = None
+        self._stopped = False
+
+    def subscribe(self, session, lines=None):
+        """
+        Adds a websocket session to the subscribers and sends it the backlog.
+
+        :param session: Websocket session ID
+        :type session: string
+        :param lines: Number of backlog lines to send, all of them if None.
+        :type lines: int
+        """
+        self._subscribers.add(session)
+
+        backlog = list(self._backlog)
+        if lines is not None:
+            backlog = backlog[-lines:] if lines > 0 else []
+
+        self._decoder.broadcast('log', {'lines': backlog, 'backlog': True}, sessions=[session])
+
+    def unsubscribe(self, session):
+        """
+        Removes a websocket session from the subscribers.
+
+        :param session: Websocket session ID
+        :type session: string
+        """
+        self._subscribers.discard(session)
+
+    def stop(self):
+        """
+        Stops the running thread.
+        """
+        self._stopped = True
+
+        if self._watcher is not None:
+            self._watcher.close()
+
+    def run(self):
+        """
+        The thread processing loop.
+        """
+        try:
+            self._watcher = TailWatcher(os.path.dirname(self.path), self._on_lines,
+                                        tail_lines=self._backlog.maxlen)
+
+            # stop() may have run before the watcher existed.
+            if self._stopped:
+                self._watcher.close()
+
+            self._watcher.loop()
+
+        except Exception, err:
+            self._decoder.app.logger.error('Error in LogTail: {0}'.format(err), exc_info=True)
+
+    def _on_lines(self, filename, lines):
+        # Rotated files keep the name they were opened with, so their last
+        # lines still come through here.
+        if filename != self.path:
+            return
+
+        lines = [l.decode('utf-8', 'replace').rstrip('\r\n') for l in lines]
+        self._backlog.extend(lines)
+
+        # Drop subscribers whose sockets have gone away without telling us.
+        self._subscribers.intersection_update(self._decoder.websocket.sockets.keys())
+        if self._subscribers:
+            self._decoder.broadcast('log', {'lines': lines, 'backlog': False}, sessions=list(self._subscribers))
+
+
+class TailWatcher(LogWatcher):
+    """
+    LogWatcher that doesn't print when files are un/watched.
+    """
+
+    def log(self, line):
+        pass
@@ -12,3 +12,50 @@ class EventLogEntry(db.Model):
     type = Column(db.SmallInteger, nullable=False)
     timestamp = Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), index=True)
     message = Column(db.Text, nullable=False)
+    zone = Column(db.Integer, nullable=True)
+    partition = Column(db.SmallInteger, nullable=True)
+    user = Column(db.Integer, nullable=True)
+    status = Column(db.SmallInteger, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_event_log_type_timestamp', 'type', 'timestamp'),
+        db.Index('ix_event_log_zone_timestamp', 'zone', 'timestamp'),
+    )
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'timestamp': str(self.timestamp),
+            'type': self.type,
+            'zone': self.zone,
+            'partition': self.partition,
+            'user': self.user,
+            'status': self.status,
+            'message': self.message,
+        }
+
+class EventLogHourly(db.Model):
+    __tablename__ = 'event_log_hourly'
+
+    id = Column(db.Integer, primary_key=True)
+    period = Column(db.DateTime, nullable=False)
+    type = Column(db.SmallInteger, nullable=False)
+    zone = Column(db.Integer, nullable=True)
+    count = Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_event_log_hourly_period', 'period', 'type', 'zone'),
+    )
+
+class EventLogDaily(db.Model):
+    __tablename__ = 'event_log_daily'
+
+    id = Column(db.Integer, primary_key=True)
+    period = Column(db.Date, nullable=False)
+    type = Column(db.SmallInteger, nullable=False)
+    zone = Column(db.Integer, nullable=True)
+    count = Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_event_log_daily_period', 'period', 'type', 'zone'),
+    )
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import func, or_
+
+from ..extensions import db
+from ..settings.models import Setting
+from .models import EventLogEntry, EventLogHourly, EventLogDaily
+from . import cache
+
+ROLLUP_SETTING = 'event_log_rollup_id'
+
+
+def delete_entries(criteria=(), chunk_size=500, pause=0.05, archive=None):
+    """
+    Deletes event log entries a chunk at a time, committing after each one
+    so the SQLite write lock is never held for long.
+
+    :param criteria: Filter expressions selecting the entries to remove.
+    :type criteria: list
+    :param chunk_size: Number of entries removed per transaction.
+    :type chunk_size: int
+    :param pause: Time in seconds to yield between chunks.
+    :type pause: float
+    :param archive: Optional callable receiving each chunk of entries
+                    once its removal has been committed.
+    :type archive: callable
+    :returns: The number of entries removed.
+    """
+    deleted = 0
+
+    while True:
+        if archive is not None:
+            entries = EventLogEntry.query.filter(*criteria).order_by(EventLogEntry.id).limit(chunk_size).all()
+            ids = [e.id for e in entries]
+
+            # Detached entries keep their values after the delete commits.
+            for e in entries:
+                db.session.expunge(e)
+        else:
+            ids = [id for id, in db.session.query(EventLogEntry.id).filter(*criteria).order_by(EventLogEntry.id).limit(chunk_size)]
+
+        if not ids:
+            break
+
+        EventLogEntry.query.filter(EventLogEntry.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+        # Archived only once they're gone, so a failed delete is never
+        # archived a second time on the next run.
+        if archive is not None:
+            archive(entries)
+
+        time.sleep(pause)
+
+    if deleted:
+        cache.invalidate()
+
+    return deleted
+
+
+def clear_entries(chunk_size=500):
+    """
+    Removes every event log entry and restarts the rollup watermark, since
+    SQLite hands out ids from 1 again once the table is empty.
+
+    :param chunk_size: Number of entries removed per transaction.
+    :type chunk_size: int
+    :returns: The number of entries removed.
+    """
+    deleted = delete_entries(chunk_size=chunk_size, pause=0)
+
+    setting = Setting.get_by_name(ROLLUP_SETTING, default=0)
+    setting.value = 0
+    db.session.add(setting)
+    db.session.commit()
+
+    return deleted
+
+
+class EventLogRetention(threading.Thread):
+    """
+    Background job keeping the event log bounded.  New entries are counted
+    into the hourly and daily rollup tables, then anything past the age or
+    row limit is written out to compressed day segments and removed.
+    """
+
+    def __init__(self, app, interval=3600, max_age=365, max_rows=500000, archive_folder=None, chunk_size=500):
+        """
+        Constructor
+
+        :param app: The flask application object
+        :type app: Flask
+        :param interval: Time in seconds between runs.
+        :type interval: int
+        :param max_age: Age in days after which entries are removed.  None
+                        or 0 keeps them regardless of age.
+        :type max_age: int
+        :param max_rows: Number of entries to keep.  None or 0 keeps them
+                         regardless of count.
+        :type max_rows: int
+        :param archive_folder: Folder receiving the archived segments.
+                               Entries are discarded if None.
+        :type archive_folder: string
+        :param chunk_size: Number of entries processed per transaction.
+        :type chunk_size: int
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.app = app
+        self.interval = interval
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.archive_folder = archive_folder
+        self.chunk_size = chunk_size
+
+        self._wakeup = threading.Event()
+        self._running = False
+
+    def stop(self):
+        """
+        Stops the running thread.
+        """
+        self._running = False
+        self._wakeup.set()
+
+    def run(self):
+        """
+        The thread processing loop.
+        """
+        self._running = True
+
+        while self._running:
+            try:
+                with self.app.app_context():
+                    self.rollup()
+                    removed = self.expire()
+
+                if removed:
+                    self.app.logger.info('Event log retention removed {0} entries.'.format(removed))
+
+            except Exception, err:
+                self.app.logger.error('Error in EventLogRetention: {0}'.format(err), exc_info=True)
+
+            self._wakeup.wait(self.interval)
+
+    def rollup(self):
+        """
+        Adds the entries written since the last run to the hourly and daily
+        rollups.
+        """
+        setting = Setting.get_by_name(ROLLUP_SETTING, default=0)
+        since = setting.value or 0
+        last_id = cache.counts.last_id()
+
+        # Ids below the watermark mean the table was emptied and SQLite
+        # started numbering again.
+        if last_id < since:
+            since = 0
+
+        while since < last_id:
+            upto = min(since + self.chunk_size, last_id)
+
+            hour = func.strftime('%Y-%m-%d %H:00:00', EventLogEntry.timestamp)
+            groups = db.session.query(hour, EventLogEntry.type, EventLogEntry.zone, func.count(EventLogEntry.id)) \
+                                .filter(EventLogEntry.id > since, EventLogEntry.id <= upto) \
+                                .group_by(hour, EventLogEntry.type, EventLogEntry.zone)
+
+            days = {}
+            for period, type, zone, count in groups:
+                period = datetime.datetime.strptime(period, '%Y-%m-%d %H:%M:%S')
+                self._add_count(EventLogHourly, period, type, zone, count)
+
+                key = (period.date(), type, zone)
+                days[key] = days.get(key, 0) + count
+
+            for (period, type, zone), count in days.iteritems():
+                self._add_count(EventLogDaily, period, type, zone, count)
+
+            setting.value = upto
+            db.session.add(setting)
+            db.session.commit()
+
+            since = upto
+
+    def expire(self):
+        """
+        Archives and removes the entries past the age or row limit.
+
+        :returns: The number of entries removed.
+        """
+        limits = []
+        if self.max_age:
+            limits.append(EventLogEntry.timestamp < datetime.datetime.utcnow() - datetime.timedelta(days=self.max_age))
+
+        if self.max_rows:
+            oldest_kept = db.session.query(EventLogEntry.id).order_by(EventLogEntry.id.desc()).offset(self.max_rows).limit(1).scalar()
+            if oldest_kept is not None:
+                limits.append(EventLogEntry.id <= oldest_kept)
+
+        if not limits:
+            return 0
+
+        # Never remove anything the rollups haven't counted yet.
+        rolled_up = Setting.get_by_name(ROLLUP_SETTING, default=0).value or 0
+        archive = self._archive if self.archive_folder else None
+
+        return delete_entries([or_(*limits), EventLogEntry.id <= rolled_up], chunk_size=self.chunk_size, archive=archive)
+
+    def _add_count(self, model, period, type, zone, count):
+        updated = model.query.filter_by(period=period, type=type, zone=zone) \
+                             .update({'count': model.count + count}, synchronize_session=False)
+
+        if not updated:
+            db.session.add(model(period=period, type=type, zone=zone, count=count))
+
+    def _archive(self, entries):
+        # One gzip member is appended per chunk, which gzip readers treat as
+        # a single continuous stream.
+        segments = {}
+        for e in entries:
+            segments.setdefault(str(e.timestamp)[:10], []).append(json.dumps(e.as_dict()))
+
+        if not os.path.exists(self.archive_folder):
+            os.makedirs(self.archive_folder)
+
+        for day, lines in segments.iteritems():
+            path = os.path.join(self.archive_folder, 'event_log-{0}.ndjson.gz'.format(day))
+            with gzip.open(path, 'ab') as f:
+                f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+    Full-text search over the event log messages.
+"""
+
+from sqlalchemy import select, literal_column
+from sqlalchemy.sql import table
+from sqlalchemy.exc import DBAPIError
+
+from ..extensions import db
+from .models import EventLogEntry
+
+FTS_TABLE = 'event_log_fts'
+
+# External content index over event_log.message, kept in sync by triggers.
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS event_log_fts USING fts5(message, content='event_log', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS event_log_fts_insert AFTER INSERT ON event_log BEGIN "
+        "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS event_log_fts_delete AFTER DELETE ON event_log BEGIN "
+        "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS event_log_fts_update AFTER UPDATE OF message ON event_log BEGIN "
+        "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+        "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END",
+)
+FTS_REBUILD = "INSERT INTO event_log_fts(event_log_fts) VALUES ('rebuild')"
+
+_available = None
+
+
+def create_index(engine):
+    """
+    Creates the full-text index and its triggers if they don't exist yet,
+    indexing any messages already in the log.  Does nothing for databases
+    other than SQLite or when SQLite was built without FTS5.
+
+    :param engine: Database engine
+    :type engine: Engine
+    :returns: Whether the index is available.
+    """
+    global _available
+
+    _available = False
+    if engine.dialect.name != 'sqlite':
+        return _available
+
+    with engine.begin() as connection:
+        exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", FTS_TABLE).scalar()
+
+        try:
+            for statement in FTS_SCHEMA:
+                connection.execute(statement)
+
+            if not exists:
+                connection.execute(FTS_REBUILD)
+
+        except DBAPIError:
+            return _available
+
+    _available = True
+    return _available
+
+
+def available():
+    """
+    Whether searches can use the full-text index.
+    """
+    global _available
+
+    if _available is None:
+        try:
+            _available = db.session.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name",
+                                            {'name': FTS_TABLE}).scalar() is not None
+        except DBAPIError:
+            _available = False
+
+    return _available
+
+
+def match_expression(term):
+    """
+    Converts a search box term into an FTS5 query.  Every word is matched as
+    a quoted prefix so punctuation in the term can't be taken for query
+    syntax.
+
+    :param term: Search term
+    :type term: string
+    """
+    words = ['"{0}"*'.format(word.replace('"', '""')) for word in term.split()]
+
+    return ' '.join(words)
+
+
+def search_criteria(term):
+    """
+    Builds the filter expression for an event log search, using the
+    full-text index when it's available and a LIKE scan otherwise.
+
+    :param term: Search term
+    :type term: string
+    """
+    expression = match_expression(term)
+    if not available() or not expression:
+        return EventLogEntry.message.like('%' + term + '%')
+
+    matches = select([literal_column('rowid')]) \
+                .select_from(table(FTS_TABLE)) \
+                .where(literal_column(FTS_TABLE).match(expression))
+
+    return EventLogEntry.id.in_(matches)
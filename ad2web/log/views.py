@@ -2,20 +2,29 @@
 
 import os
 
-from flask import Blueprint, render_template, abort, g, request, flash, Response, url_for, redirect
+from flask import Blueprint, render_template, abort, g, request, flash, Response, url_for, redirect, stream_with_context
 from flask import current_app as APP
 from flask.ext.login import login_required, current_user
 
-from ..extensions import db
+from sqlalchemy import or_
+
 from ..decorators import admin_required
 from .constants import ARM, DISARM, POWER_CHANGED, ALARM, FIRE, BYPASS, BOOT, \
                         CONFIG_RECEIVED, ZONE_FAULT, ZONE_RESTORE, LOW_BATTERY, \
                         PANIC, RELAY_CHANGED, EVENT_TYPES
 from .models import EventLogEntry
+from . import cache
+from .search import search_criteria
+from .retention import clear_entries
+from .index import get_index as get_log_index, LEVELS as LOG_LEVELS
 from ..logwatch import LogWatcher
 from ..utils import INSTANCE_FOLDER_PATH
 
+import io
+import csv
 import json
+import zlib
+import datetime
 import collections
 
 log = Blueprint('log', __name__, url_prefix='/log')
@@ -57,8 +66,7 @@ def live():
 @login_required
 @admin_required
 def delete():
-    events = EventLogEntry.query.delete()
-    db.session.commit()
+    clear_entries(chunk_size=APP.config['EVENT_LOG_DELETE_CHUNK'])
     return redirect(url_for('log.events'))
 
 @log.route('/alarmdecoder')
@@ -74,12 +82,174 @@ def get_log_data(lines):
     log_file = os.path.join(INSTANCE_FOLDER_PATH, 'logs', 'info.log')
 
     try:
-        log_text = LogWatcher.tail(log_file, lines)
+        log_text = LogWatcher.tail(log_file, lines, rotated=APP.config['LOG_BACKUP_COUNT'])
     except IOError, err:
         return json.dumps([str(err)])
 
     return json.dumps(log_text)
 
+@log.route('/alarmdecoder/search', methods=['GET'])
+@login_required
+@admin_required
+def search_log_data():
+    log_file = os.path.join(INSTANCE_FOLDER_PATH, 'logs', 'info.log')
+    level = request.args.get('level') or None
+    if level is not None and level.upper() not in LOG_LEVELS:
+        abort(400)
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', 500)), 5000))
+    except ValueError:
+        abort(400)
+
+    since = _log_time_value(request.args, 'since')
+    until = _log_time_value(request.args, 'until')
+
+    index = get_log_index(log_file, APP.config['LOG_BACKUP_COUNT'])
+    results, truncated = index.search(since=since,
+                                        until=until,
+                                        text=request.args.get('q') or None,
+                                        level=level,
+                                        limit=limit)
+
+    return json.dumps({'results': results, 'truncated': truncated})
+
+#log times are local, as 'YYYY-MM-DD HH:MM[:SS]', and compared as strings so
+#they're normalized to the zero-padded form the log formatter writes
+def _log_time_value(values, name):
+    value = values.get(name) or None
+    if value is None:
+        return None
+
+    for format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.datetime.strptime(value, format).strftime(format)
+        except ValueError:
+            pass
+
+    abort(400)
+
+@log.route('/export')
+@login_required
+def export():
+    format = request.args.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        abort(400)
+
+    compress = request.args.get('gzip') in ('1', 'true')
+    criteria = event_criteria(event_filters(request.args))
+
+    #rows are fetched from the cursor in batches and written out as they arrive
+    entries = EventLogEntry.query.filter(*criteria) \
+                                 .order_by(EventLogEntry.timestamp, EventLogEntry.id) \
+                                 .yield_per(EXPORT_BATCH_SIZE)
+
+    data = EXPORT_FORMATS[format](entries)
+    if compress:
+        data = _gzip_stream(data)
+
+    filename = 'events.{0}{1}'.format(format, '.gz' if compress else '')
+    headers = {'Content-Disposition': 'attachment; filename={0}'.format(filename)}
+
+    return Response(stream_with_context(data),
+                    mimetype=EXPORT_MIMETYPES['gzip' if compress else format],
+                    headers=headers)
+
+def _export_csv(entries):
+    buffer = io.BytesIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_FIELDS)
+    for count, entry in enumerate(entries, 1):
+        row = entry.as_dict()
+        writer.writerow([_csv_value(row[f]) for f in EXPORT_FIELDS])
+
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+def _csv_value(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+
+    return value
+
+def _export_ndjson(entries):
+    lines = []
+    for entry in entries:
+        lines.append(json.dumps(entry.as_dict()))
+
+        if len(lines) == EXPORT_BATCH_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def _gzip_stream(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in data:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_FIELDS = ['id', 'timestamp', 'type', 'zone', 'partition', 'user', 'status', 'message']
+EXPORT_FORMATS = {
+    'csv': _export_csv,
+    'ndjson': _export_ndjson,
+}
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'gzip': 'application/gzip',
+}
+
+#type, zone and date range filters shared by the event table and exports
+def event_filters(values):
+    events = collections.namedtuple('events', ['type', 'zone', 'since', 'until'])
+
+    return events(type=_int_value(values, 'type'),
+                    zone=_int_value(values, 'zone'),
+                    since=_date_value(values, 'since'),
+                    until=_date_value(values, 'until'))
+
+def event_criteria(events):
+    criteria = []
+    if events.type is not None:
+        criteria.append(EventLogEntry.type == events.type)
+    if events.zone is not None:
+        criteria.append(EventLogEntry.zone == events.zone)
+    if events.since is not None:
+        criteria.append(EventLogEntry.timestamp >= events.since)
+    if events.until is not None:
+        criteria.append(EventLogEntry.timestamp < events.until)
+
+    return criteria
+
+def _int_value(values, name):
+    try:
+        return int(values.get(name, ''))
+    except ValueError:
+        return None
+
+#dates are UTC, either as the ISO strings sent by the event table or plain days
+def _date_value(values, name):
+    value = values.get(name, '')
+    for format in ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, format)
+        except ValueError:
+            pass
+
+    return None
+
 #XHR for retrieving event log data server side
 @log.route('/retrieve_events_paging_data')
 @login_required
@@ -107,7 +277,7 @@ class DataTablesServer:
         output = {}
         output['sEcho'] = str(int(self.request_values['sEcho']))
         output['iTotalRecords'] = int(self.cardinality);
-        output['iTotalDisplayRecords'] = int(self.cardinality);
+        output['iTotalDisplayRecords'] = int(self.cardinality_filtered);
 
         aaData_rows = []
 
@@ -138,15 +308,52 @@ class DataTablesServer:
         if pages.length is not None:
             limit = pages.length
 
-        #if filtered, cardinality based off filter, otherwise all rows
+        criteria = []
         if filter is not None:
-            self.result_data = EventLogEntry.query.filter(EventLogEntry.message.like('%' + filter + '%')).order_by(EventLogEntry.timestamp.desc()).limit(limit).offset(start)
-            self.cardinality_filtered = self.result_data.count()
-            self.cardinality = EventLogEntry.query.filter(EventLogEntry.message.like('%' + filter + '%')).count()
+            criteria.append(search_criteria(filter))
+
+        events = self.event_filtering()
+        criteria.extend(event_criteria(events))
+
+        key = (filter,) + tuple(events)
+
+        #counts are cached, only rows newer than the cached ones get counted
+        last_id = cache.counts.last_id()
+        self.cardinality = cache.counts.total()
+        if criteria:
+            self.cardinality_filtered = cache.counts.filtered(key, criteria, last_id)
         else:
-            self.result_data = EventLogEntry.query.order_by(EventLogEntry.timestamp.desc()).limit(limit).offset(start)
-            self.cardinality_filtered = self.result_data.count()
-            self.cardinality = EventLogEntry.query.order_by(EventLogEntry.timestamp.desc()).count()
+            self.cardinality_filtered = self.cardinality
+
+        self.result_data = self.fetch_page(key, criteria, last_id, start, limit)
+
+    #continue from the last row of the previous page when we've served it, otherwise
+    #fall back to an offset counted from whichever end of the log is closer
+    def fetch_page(self, key, criteria, last_id, start, limit):
+        query = EventLogEntry.query.filter(EventLogEntry.id <= last_id, *criteria)
+        newest_first = (EventLogEntry.timestamp.desc(), EventLogEntry.id.desc())
+        total = self.cardinality_filtered
+
+        cursor = cache.cursors.get(key, last_id, start) if start > 0 else None
+        if cursor is not None:
+            timestamp, id = cursor
+            rows = query.filter(EventLogEntry.timestamp <= timestamp,
+                                or_(EventLogEntry.timestamp < timestamp, EventLogEntry.id < id)) \
+                        .order_by(*newest_first).limit(limit).all()
+        elif start > total / 2:
+            count = min(limit, total - start)
+            rows = []
+            if count > 0:
+                rows = query.order_by(EventLogEntry.timestamp.asc(), EventLogEntry.id.asc()) \
+                            .limit(count).offset(total - start - count).all()
+                rows.reverse()
+        else:
+            rows = query.order_by(*newest_first).limit(limit).offset(start).all()
+
+        if rows:
+            cache.cursors.set(key, last_id, start + len(rows), (rows[-1].timestamp, rows[-1].id))
+
+        return rows
 
     #here we determine the filter value for the search box and apply to the queries
     def filtering(self):
@@ -156,6 +363,10 @@ class DataTablesServer:
 
         return filter
 
+    #event type, zone and date range chosen from the filter controls
+    def event_filtering(self):
+        return event_filters(self.request_values)
+
     #determine what page we're on, as well as how many to show per page
     def paging(self):
         pages = collections.namedtuple('pages', ['start', 'length'])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import threading
+import time
+
+from ..extensions import db
+from .models import EventLogEntry
+from .cache import counts
+
+
+class EventLogWriter(threading.Thread):
+    """
+    Write-behind buffer for the event log.  Entries are collected in memory
+    and written in a single transaction every *interval* milliseconds or as
+    soon as *batch_size* entries are waiting.
+    """
+
+    MAX_PENDING = 10000
+    """Upper bound on buffered entries if the database stays unavailable."""
+
+    def __init__(self, app, interval=250, batch_size=100):
+        """
+        Constructor
+
+        :param app: The flask application object
+        :type app: Flask
+        :param interval: Maximum time in milliseconds an entry is buffered.
+        :type interval: int
+        :param batch_size: Number of buffered entries that triggers an
+                           early flush.
+        :type batch_size: int
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+
+        self._flushes = 0
+        self._rows = 0
+        self._last_batch = 0
+        self._max_batch = 0
+        self._last_latency = 0.0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def add(self, type, message, zone=None, partition=None, user=None, status=None):
+        """
+        Buffers an event log entry.
+
+        :param type: Event type
+        :type type: int
+        :param message: Message text
+        :type message: string
+        :param zone: Zone the event applies to
+        :type zone: int
+        :param partition: Partition the event applies to
+        :type partition: int
+        :param user: User code number that triggered the event
+        :type user: int
+        :param status: Event-specific status value
+        :type status: int
+        """
+        entry = dict(type=type, message=message, timestamp=datetime.datetime.utcnow().replace(microsecond=0),
+                        zone=zone, partition=partition, user=user, status=status)
+
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Writes all of the buffered entries in a single transaction.
+        """
+        with self._lock:
+            entries, self._pending = self._pending, []
+
+        if not entries:
+            return
+
+        start = time.time()
+        try:
+            with self.app.app_context():
+                db.session.execute(EventLogEntry.__table__.insert(), entries)
+                db.session.commit()
+
+        except Exception, err:
+            self.app.logger.error('Error writing event log: {0}'.format(err), exc_info=True)
+
+            # Put them back for the next attempt.
+            with self._lock:
+                self._pending = (entries + self._pending)[-self.MAX_PENDING:]
+
+            return
+
+        latency = time.time() - start
+        count = len(entries)
+
+        counts.inserted(count)
+
+        self._flushes += 1
+        self._rows += count
+        self._last_batch = count
+        self._max_batch = max(self._max_batch, count)
+        self._last_latency = latency
+        self._total_latency += latency
+        self._max_latency = max(self._max_latency, latency)
+
+    def stats(self):
+        """
+        Retrieves the flush statistics.
+
+        :returns: A dictionary of batch size and latency metrics.
+        """
+        return {
+            'pending': len(self._pending),
+            'flushes': self._flushes,
+            'rows': self._rows,
+            'last_batch': self._last_batch,
+            'max_batch': self._max_batch,
+            'avg_batch': float(self._rows) / self._flushes if self._flushes else 0.0,
+            'last_latency': self._last_latency,
+            'max_latency': self._max_latency,
+            'avg_latency': self._total_latency / self._flushes if self._flushes else 0.0,
+        }
+
+    def stop(self):
+        """
+        Stops the thread and flushes anything still buffered.
+        """
+        self._running = False
+        self._wakeup.set()
+
+        self.flush()
+
+    def run(self):
+        """
+        The thread processing loop.
+        """
+        self._running = True
+
+        while self._running:
+            self._wakeup.wait(self.interval / 1000.0)
+            self._wakeup.clear()
+
+            self.flush()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+    Non-blocking application logging.
+"""
+
+import collections
+import json
+import logging
+import time
+
+from gevent.monkey import get_original
+
+# The writer has to be a real OS thread so that a stalled disk blocks it and
+# not the gevent loop, which also means it can't use the patched primitives.
+_start_new_thread, _allocate_lock = get_original('thread', ['start_new_thread', 'allocate_lock'])
+
+
+class QueueHandler(logging.Handler):
+    """
+    Logging handler that only queues records.  A single writer thread hands
+    them to the target handler, so file writes and rotations happen off of
+    the caller's greenlet.  Records arriving while the queue is full are
+    dropped and counted.
+    """
+
+    def __init__(self, target, max_pending=1000):
+        """
+        Constructor
+
+        :param target: Handler doing the actual output.
+        :type target: logging.Handler
+        :param max_pending: Maximum number of queued records.
+        :type max_pending: int
+        """
+        logging.Handler.__init__(self)
+        self.target = target
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+
+        self._pending = collections.deque()
+        self._running = True
+
+        # Used as a binary semaphore: released whenever there's work.
+        self._wakeup = _allocate_lock()
+        self._wakeup.acquire()
+
+        # Released by the writer thread once it has finished.
+        self._stopped = _allocate_lock()
+        self._stopped.acquire()
+
+        # Only the writer thread uses the target from now on, and the
+        # patched lock it was created with can't block a real thread.
+        target.lock = None
+
+        _start_new_thread(self._run, ())
+
+    def emit(self, record):
+        """
+        Queues a record for the writer thread.
+
+        :param record: The log record
+        :type record: logging.LogRecord
+        """
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+
+        try:
+            self._pending.append(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+            return
+
+        self._notify()
+
+    def prepare(self, record):
+        """
+        Resolves everything in the record that refers to the caller's state
+        before it's handed to another thread.
+
+        :param record: The log record
+        :type record: logging.LogRecord
+        """
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            formatter = self.target.formatter or logging.Formatter()
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def stats(self):
+        """
+        Retrieves the queue statistics.
+
+        :returns: A dictionary with the pending, written and dropped counts.
+        """
+        return {
+            'pending': len(self._pending),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def close(self, timeout=5):
+        """
+        Stops the writer thread and waits for it to write everything queued.
+
+        :param timeout: Maximum time in seconds to wait for the writer.
+        :type timeout: float
+        """
+        if self._running:
+            self._running = False
+            self._notify()
+
+            deadline = time.time() + timeout
+            while not self._stopped.acquire(False) and time.time() < deadline:
+                time.sleep(0.01)
+
+        logging.Handler.close(self)
+
+    def _notify(self):
+        try:
+            self._wakeup.release()
+        except Exception:
+            pass    # Already signalled.
+
+    def _run(self):
+        reported = 0
+
+        while True:
+            self._wakeup.acquire()
+
+            while self._pending:
+                self._write(self._pending.popleft())
+
+            dropped = self.dropped
+            if dropped > reported:
+                self._write(logging.makeLogRecord({
+                    'name': __name__,
+                    'levelno': logging.WARNING,
+                    'levelname': 'WARNING',
+                    'pathname': __file__,
+                    'msg': '{0} log records dropped, logging queue was full.'.format(dropped - reported),
+                }))
+                reported = dropped
+
+            if not self._running:
+                self._close_target()
+                self._stopped.release()
+                return
+
+    def _close_target(self):
+        # Handler.close() takes the logging module lock, which gevent has
+        # patched and this thread can't wait on, so only the stream is closed.
+        stream = getattr(self.target, 'stream', None)
+        if stream is None:
+            return
+
+        try:
+            stream.flush()
+            stream.close()
+        except Exception:
+            pass
+
+        self.target.stream = None
+
+    def _write(self, record):
+        try:
+            self.target.handle(record)
+            self.written += 1
+        except Exception:
+            self.target.handleError(record)
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats records as single line JSON objects.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'path': record.pathname,
+            'line': record.lineno,
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry)
@@ -13,6 +13,96 @@ import time
 import errno
 import stat
 import sys
+import select
+import struct
+import ctypes
+import ctypes.util
+
+
+class Inotify(object):
+    """Minimal ctypes binding for the Linux inotify API, used to block
+    until something in the watched folder changes instead of polling.
+    Raises OSError if inotify isn't available.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+
+    IN_CLOEXEC = 0o2000000
+    IN_NONBLOCK = 0o4000
+
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self):
+        libname = ctypes.util.find_library('c')
+        try:
+            self._libc = ctypes.CDLL(libname, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        self.fd = init(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        # Written to by interrupt() to wake up a blocked read().
+        self._wakeup_r, self._wakeup_w = os.pipe()
+
+    def add_watch(self, path, mask):
+        """Watch a file or folder for the events in *mask*."""
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+        wd = self._libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self, timeout=None):
+        """Block until events are available and return them as a list
+        of (wd, mask, cookie, name) tuples. Returns an empty list if
+        interrupted or on timeout.
+        """
+        ready = select.select([self.fd, self._wakeup_r], [], [], timeout)[0]
+        if self._wakeup_r in ready or self.fd not in ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError as err:
+            if err.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        pos = 0
+        while pos + self.EVENT.size <= len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, pos)
+            pos += self.EVENT.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            events.append((wd, mask, cookie,
+                           name.decode(sys.getfilesystemencoding())))
+        return events
+
+    def interrupt(self):
+        """Wake up a blocked read()."""
+        try:
+            os.write(self._wakeup_w, b'x')
+        except OSError:
+            pass  # already closed
+
+    def close(self):
+        for fd in (self.fd, self._wakeup_r, self._wakeup_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
 
 
 class LogWatcher(object):
@@ -29,8 +119,12 @@ class LogWatcher(object):
     >>> lw.loop()
     """
 
+    # Events on the watched folder that add, remove or rotate files.
+    INOTIFY_CHANGES = Inotify.IN_CREATE | Inotify.IN_DELETE | \
+                      Inotify.IN_MOVED_FROM | Inotify.IN_MOVED_TO
+
     def __init__(self, folder, callback, extensions=["log"], tail_lines=0,
-                       sizehint=1048576):
+                       sizehint=1048576, use_inotify=True):
         """Arguments:
 
         (str) @folder:
@@ -51,9 +145,16 @@ class LogWatcher(object):
             approximation of the maximum number of bytes to read from
             a file on every ieration (as opposed to load the entire
             file in memory until EOF is reached). Defaults to 1MB.
+
+        (bool) @use_inotify:
+            block on inotify events in loop() instead of polling when
+            the platform supports it.
         """
         self.folder = os.path.realpath(folder)
         self.extensions = extensions
+        self.use_inotify = use_inotify
+        self._inotify = None
+        self._closed = False
         self._files_map = {}
         self._callback = callback
         self._sizehint = sizehint
@@ -82,14 +183,22 @@ class LogWatcher(object):
         self.close()
 
     def loop(self, interval=0.1, blocking=True):
-        """Start a busy loop checking for file changes every *interval*
-        seconds. If *blocking* is False make one loop then return.
+        """Start a loop waiting for file changes. Uses inotify to block
+        until the folder is updated when available, otherwise checks for
+        changes every *interval* seconds. If *blocking* is False make one
+        loop then return.
         """
-        # May be overridden in order to use pyinotify lib and block
-        # until the directory being watched is updated.
+        if blocking and self.use_inotify and not self._closed:
+            try:
+                inotify = Inotify()
+            except OSError as err:
+                self.log("inotify unavailable, polling instead: %s" % err)
+            else:
+                return self._inotify_loop(inotify)
+
         # Note that directly calling readlines() as we do is faster
         # than first checking file's last modification times.
-        while True:
+        while not self._closed:
             self.update_files()
             for fid, file in list(self._files_map.items()):
                 self.readlines(file)
@@ -97,6 +206,49 @@ class LogWatcher(object):
                 return
             time.sleep(interval)
 
+    def _inotify_loop(self, inotify):
+        mask = Inotify.IN_MODIFY | Inotify.IN_Q_OVERFLOW | self.INOTIFY_CHANGES
+        try:
+            inotify.add_watch(self.folder, mask)
+        except OSError:
+            inotify.close()
+            raise
+
+        self._inotify = inotify
+        try:
+            # close() may have run before there was anything to interrupt.
+            if self._closed:
+                return
+
+            # Changes made between the constructor and now.
+            self.update_files()
+            for fid, file in list(self._files_map.items()):
+                self.readlines(file)
+
+            while self._inotify is not None and not self._closed:
+                events = inotify.read()
+                if not events:
+                    continue
+
+                modified = set()
+                rescan = False
+                for wd, mask, cookie, name in events:
+                    if mask & (self.INOTIFY_CHANGES | Inotify.IN_Q_OVERFLOW):
+                        rescan = True
+                    if mask & (Inotify.IN_MODIFY | Inotify.IN_Q_OVERFLOW):
+                        modified.add(name)
+
+                # Rotation shows up as IN_MOVED_FROM for the old file and
+                # IN_CREATE for the new one; update_files() drains the old
+                # file before switching over.
+                if rescan:
+                    self.update_files()
+                for fid, file in list(self._files_map.items()):
+                    if rescan or os.path.basename(file.name) in modified:
+                        self.readlines(file)
+        finally:
+            inotify.close()
+
     def log(self, line):
         """Log when a file is un/watched"""
         print(line)
@@ -129,36 +281,56 @@ class LogWatcher(object):
         return open(file, 'rb')
 
     @classmethod
-    def tail(cls, fname, window):
-        """Read last N lines from file fname."""
+    def tail(cls, fname, window, rotated=0):
+        """Read last N lines from file fname. If *rotated* is given and
+        fname holds fewer than N lines, keep reading backwards through its
+        rotated copies fname.1 ... fname.<rotated>.
+        """
         if window <= 0:
             raise ValueError('invalid window value %r' % window)
+        names = [fname] + ['%s.%d' % (fname, i) for i in range(1, rotated + 1)]
+        lines = []
+        for name in names:
+            try:
+                older = cls._tail_file(name, window - len(lines))
+            except IOError as err:
+                if name == fname or err.errno != errno.ENOENT:
+                    raise
+                break
+            lines = older + lines
+            if len(lines) >= window:
+                break
+        return lines[-window:]
+
+    @classmethod
+    def _tail_file(cls, fname, window, bufsize=4096, max_bufsize=1048576):
+        """Read last N lines from a single file, reading blocks backwards
+        from the end. Every byte is read and scanned for newlines once and
+        the block size doubles as we go, so this is linear in the amount
+        of data returned.
+        """
         with cls.open(fname) as f:
-            BUFSIZ = 1024
             # True if open() was overridden and file was opened in text
             # mode. In that case readlines() will return unicode strings
             # instead of bytes.
             encoded = getattr(f, 'encoding', False)
             CR = '\n' if encoded else b'\n'
-            data = '' if encoded else b''
             f.seek(0, os.SEEK_END)
-            fsize = f.tell()
-            block = -1
-            exit = False
-            while not exit:
-                step = (block * BUFSIZ)
-                if abs(step) >= fsize:
-                    f.seek(0)
-                    newdata = f.read(BUFSIZ - (abs(step) - fsize))
-                    exit = True
-                else:
-                    f.seek(step, os.SEEK_END)
-                    newdata = f.read(BUFSIZ)
-                data = newdata + data
-                if data.count(CR) >= window:
-                    break
-                else:
-                    block -= 1
+            pos = f.tell()
+            blocks = []
+            newlines = 0
+            # One newline more than the window guarantees the first line
+            # we keep is complete.
+            while pos > 0 and newlines <= window:
+                size = min(bufsize, pos)
+                pos -= size
+                f.seek(pos)
+                block = f.read(size)
+                blocks.append(block)
+                newlines += block.count(CR)
+                bufsize = min(bufsize * 2, max_bufsize)
+            blocks.reverse()
+            data = ('' if encoded else b'').join(blocks)
             return data.splitlines()[-window:]
 
     def update_files(self):
@@ -236,6 +408,10 @@ class LogWatcher(object):
             return "%f" % st.st_ctime
 
     def close(self):
+        self._closed = True
+        inotify, self._inotify = self._inotify, None
+        if inotify is not None:
+            inotify.interrupt()
         for id, file in self._files_map.items():
             file.close()
         self._files_map.clear()
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
 
-from .models import Notification, NotificationSetting
+from .models import Notification, NotificationSetting, NotificationOutbox
 from .views import notifications
 from .types import NotificationSystem
@@ -67,6 +67,18 @@ NOTIFICATIONS = {
     GOOGLETALK: ('googletalk', u'Google Talk'),
 }
 
+OUTBOX_PENDING = 0
+OUTBOX_SENDING = 1
+OUTBOX_DELIVERED = 2
+OUTBOX_FAILED = 3
+
+OUTBOX_STATES = {
+    OUTBOX_PENDING: 'pending',
+    OUTBOX_SENDING: 'sending',
+    OUTBOX_DELIVERED: 'delivered',
+    OUTBOX_FAILED: 'failed',
+}
+
 DEFAULT_SUBSCRIPTIONS = [ALARM, PANIC, FIRE, ARM, DISARM]
 
 SUBSCRIPTIONS = OrderedDict([
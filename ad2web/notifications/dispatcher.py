@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+import Queue
+
+from ..extensions import db
+from .constants import OUTBOX_PENDING, OUTBOX_SENDING, OUTBOX_DELIVERED, OUTBOX_FAILED
+from .models import NotificationOutbox
+
+
+class NotificationDispatcher(object):
+    """
+    Delivers notifications from a pool of worker threads so that slow
+    notifiers never hold up the device event path.  Every delivery is
+    recorded in the notification outbox first, which lets failed deliveries
+    be retried and lets pending ones survive a restart.
+    """
+
+    def __init__(self, app, resolver, workers=2, queue_size=100, queue_timeout=0.5, concurrency=1,
+                    max_attempts=8, retry_delay=30, retry_max_delay=3600, retention=86400):
+        """
+        Constructor
+
+        :param app: The flask application object
+        :type app: Flask
+        :param resolver: Callable returning the notifier for a given id.
+        :type resolver: callable
+        :param workers: Number of worker threads.
+        :type workers: int
+        :param queue_size: Maximum number of pending deliveries.
+        :type queue_size: int
+        :param queue_timeout: Time to wait for room in a full queue before
+                              leaving a delivery to the retry scheduler.
+        :type queue_timeout: float
+        :param concurrency: Maximum number of simultaneous deliveries per
+                            notifier.
+        :type concurrency: int
+        :param max_attempts: Number of attempts before a delivery is marked
+                             as failed.
+        :type max_attempts: int
+        :param retry_delay: Delay in seconds before the first retry.  Doubles
+                            with each attempt.
+        :type retry_delay: int
+        :param retry_max_delay: Upper bound for the retry delay.
+        :type retry_max_delay: int
+        :param retention: Age in seconds after which delivered entries are
+                          removed from the outbox.
+        :type retention: int
+        """
+        self.app = app
+        self.queue_timeout = queue_timeout
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.retention = retention
+
+        self._resolver = resolver
+        self._queue = Queue.Queue(maxsize=queue_size)
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._workers = [NotificationWorker(self) for i in range(workers)]
+        self._scheduler = OutboxScheduler(self)
+
+    def start(self):
+        """
+        Recovers deliveries interrupted by a previous shutdown and starts the
+        worker threads.
+        """
+        with self.app.app_context():
+            NotificationOutbox.query.filter_by(state=OUTBOX_SENDING) \
+                                    .update({'state': OUTBOX_PENDING}, synchronize_session=False)
+            db.session.commit()
+
+        for w in self._workers:
+            w.start()
+
+        self._scheduler.start()
+
+    def stop(self):
+        """
+        Stops the worker threads.
+        """
+        self._scheduler.stop()
+
+        for w in self._workers:
+            w.stop()
+
+    def send(self, type, message, ids, event_id=None):
+        """
+        Records a notification for each notifier in the outbox and queues
+        the deliveries.
+
+        :param type: Event type
+        :type type: int
+        :param message: Message text
+        :type message: string
+        :param ids: Notifier ids to deliver to.
+        :type ids: list
+        :param event_id: Unique id of the event, which together with the
+                         notifier makes up the entry's key.  One is made up
+                         if None.
+        :type event_id: string
+        """
+        event_key = self._event_key(type, event_id or uuid.uuid4().hex)
+        keys = dict(('{0}:{1}'.format(event_key, id), id) for id in ids)
+        if not keys:
+            return
+
+        entries = [NotificationOutbox(key=key, notification_id=id, type=type, message=message)
+                    for key, id in keys.iteritems()]
+        db.session.add_all(entries)
+        db.session.commit()
+
+        for entry in entries:
+            self.enqueue(entry.id)
+
+    def enqueue(self, entry_id):
+        """
+        Queues an outbox entry for delivery.  Entries that don't fit in the
+        queue stay pending and are picked up again by the retry scheduler.
+
+        :param entry_id: Outbox entry id
+        :type entry_id: int
+        :returns: False if the queue stayed full.
+        """
+        with self._lock:
+            if entry_id in self._queued:
+                return True
+
+            self._queued.add(entry_id)
+
+        try:
+            self._queue.put(entry_id, timeout=self.queue_timeout)
+
+        except Queue.Full:
+            with self._lock:
+                self._queued.discard(entry_id)
+
+            return False
+
+        return True
+
+    def pending(self):
+        """
+        Number of deliveries waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    def deliver(self, entry_id):
+        """
+        Sends a single outbox entry, honoring the per-notifier concurrency
+        limit, and records the outcome.
+
+        :param entry_id: Outbox entry id
+        :type entry_id: int
+        """
+        with self._lock:
+            self._queued.discard(entry_id)
+
+        with self.app.app_context():
+            entry = NotificationOutbox.query.filter_by(id=entry_id).first()
+            if entry is None or entry.state != OUTBOX_PENDING:
+                return
+
+            notifier = self._resolver(entry.notification_id)
+            if notifier is None:
+                entry.state = OUTBOX_FAILED
+                entry.last_error = 'Notification no longer exists.'
+                db.session.commit()
+                return
+
+            entry.state = OUTBOX_SENDING
+            entry.attempts += 1
+            db.session.commit()
+
+            with self._get_limit(entry.notification_id):
+                try:
+                    notifier.send(entry.type, entry.message)
+
+                except Exception, err:
+                    self.app.logger.error('Error sending notification for {0}: {1}'.format(notifier.description, str(err)))
+
+                    entry.last_error = str(err)
+                    if entry.attempts >= self.max_attempts:
+                        entry.state = OUTBOX_FAILED
+                    else:
+                        entry.state = OUTBOX_PENDING
+                        entry.next_attempt = datetime.datetime.utcnow() + datetime.timedelta(seconds=self._backoff(entry.attempts))
+
+                else:
+                    entry.state = OUTBOX_DELIVERED
+                    entry.last_error = None
+
+            db.session.commit()
+
+    def schedule(self):
+        """
+        Queues pending entries whose retry time has come and prunes old
+        delivered entries.
+        """
+        now = datetime.datetime.utcnow()
+
+        with self.app.app_context():
+            due = NotificationOutbox.query.filter(NotificationOutbox.state == OUTBOX_PENDING,
+                                                    NotificationOutbox.next_attempt <= now) \
+                                          .order_by(NotificationOutbox.next_attempt) \
+                                          .limit(self._queue.maxsize)
+
+            entry_ids = [entry.id for entry in due]
+
+            NotificationOutbox.query.filter(NotificationOutbox.state == OUTBOX_DELIVERED,
+                                            NotificationOutbox.updated < now - datetime.timedelta(seconds=self.retention)) \
+                                    .delete(synchronize_session=False)
+            db.session.commit()
+
+        for entry_id in entry_ids:
+            if not self.enqueue(entry_id):
+                break
+
+    def _backoff(self, attempts):
+        return min(self.retry_delay * (2 ** (attempts - 1)), self.retry_max_delay)
+
+    def _event_key(self, type, event_id):
+        return hashlib.sha1('{0}:{1}'.format(type, event_id)).hexdigest()
+
+    def _get_limit(self, id):
+        with self._lock:
+            if id not in self._limits:
+                self._limits[id] = threading.BoundedSemaphore(self.concurrency)
+
+            return self._limits[id]
+
+
+class NotificationWorker(threading.Thread):
+    """
+    Worker thread pulling deliveries off of the dispatcher queue.
+    """
+
+    TIMEOUT = 1
+    """Queue wait time before checking whether we've been stopped."""
+
+    def __init__(self, dispatcher):
+        """
+        Constructor
+
+        :param dispatcher: Parent dispatcher
+        :type dispatcher: NotificationDispatcher
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._dispatcher = dispatcher
+        self._running = False
+
+    def stop(self):
+        """
+        Stops the running thread.
+        """
+        self._running = False
+
+    def run(self):
+        """
+        The thread processing loop.
+        """
+        self._running = True
+
+        while self._running:
+            try:
+                entry_id = self._dispatcher._queue.get(timeout=self.TIMEOUT)
+            except Queue.Empty:
+                continue
+
+            try:
+                self._dispatcher.deliver(entry_id)
+
+            except Exception, err:
+                self._dispatcher.app.logger.error('Error in NotificationWorker: {0}'.format(err), exc_info=True)
+
+
+class OutboxScheduler(threading.Thread):
+    """
+    Thread responsible for re-queueing notifications that are due for a retry.
+    """
+
+    TIMEOUT = 5
+    """Thread sleep time."""
+
+    def __init__(self, dispatcher):
+        """
+        Constructor
+
+        :param dispatcher: Parent dispatcher
+        :type dispatcher: NotificationDispatcher
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._dispatcher = dispatcher
+        self._running = False
+
+    def stop(self):
+        """
+        Stops the running thread.
+        """
+        self._running = False
+
+    def run(self):
+        """
+        The thread processing loop.
+        """
+        self._running = True
+
+        while self._running:
+            try:
+                self._dispatcher.schedule()
+
+            except Exception, err:
+                self._dispatcher.app.logger.error('Error in OutboxScheduler: {0}'.format(err), exc_info=True)
+
+            time.sleep(self.TIMEOUT)
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import datetime
+
 from OpenSSL import crypto, SSL
 from sqlalchemy import Column, orm
 from sqlalchemy.orm.collections import attribute_mapped_collection
 
 from ..extensions import db
+from .constants import OUTBOX_PENDING
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
@@ -58,4 +61,19 @@ class NotificationMessage(db.Model):
     __tablename__ = 'notification_messages'
 
     id = Column(db.Integer, primary_key=True)
-    text = Column(db.Text, nullable=False)
\ No newline at end of file
+    text = Column(db.Text, nullable=False)
+
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+
+    id = Column(db.Integer, primary_key=True, autoincrement=True)
+    key = Column(db.String(64), unique=True, nullable=False)
+    notification_id = Column(db.Integer, nullable=False, index=True)
+    type = Column(db.SmallInteger)
+    message = Column(db.Text, nullable=False)
+    state = Column(db.SmallInteger, nullable=False, default=OUTBOX_PENDING, index=True)
+    attempts = Column(db.Integer, nullable=False, default=0)
+    next_attempt = Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+    last_error = Column(db.Text)
+    created = Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated = Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
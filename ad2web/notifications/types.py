@@ -6,37 +6,70 @@ from email.mime.text import MIMEText
 import sleekxmpp
 import json
 import re
+from string import Formatter
 
-from .constants import EMAIL, GOOGLETALK, DEFAULT_EVENT_MESSAGES
+from .constants import EMAIL, GOOGLETALK, EVENT_TYPES
 from .models import Notification, NotificationSetting, NotificationMessage
-from ..extensions import db
-from ..log.models import EventLogEntry
+from .dispatcher import NotificationDispatcher
 from ..zones import Zone
 
 
 class NotificationSystem(object):
-    def __init__(self):
+    def __init__(self, log_writer):
+        self._log_writer = log_writer
         self._notifiers = {}
-        self._messages = DEFAULT_EVENT_MESSAGES
+        self._subscribers = {}
+        self._messages = None
+        self._zone_names = None
+
+        config = current_app.config
+        self._dispatcher = NotificationDispatcher(current_app._get_current_object(),
+                                                    self._notifiers.get,
+                                                    workers=config['NOTIFICATION_WORKERS'],
+                                                    queue_size=config['NOTIFICATION_QUEUE_SIZE'],
+                                                    queue_timeout=config['NOTIFICATION_QUEUE_TIMEOUT'],
+                                                    concurrency=config['NOTIFICATION_CONCURRENCY'],
+                                                    max_attempts=config['NOTIFICATION_MAX_ATTEMPTS'],
+                                                    retry_delay=config['NOTIFICATION_RETRY_DELAY'],
+                                                    retry_max_delay=config['NOTIFICATION_RETRY_MAX_DELAY'],
+                                                    retention=config['NOTIFICATION_OUTBOX_RETENTION'])
 
         self._init_notifiers()
+        self._dispatcher.start()
 
-    def send(self, type, **kwargs):
+    def send(self, type, event_id=None, **kwargs):
         errors = []
+        ids = []
+        message = None
 
-        for id, n in self._notifiers.iteritems():
-            if n and n.subscribes_to(type):
-                try:
+        for id, n in self._subscribers.get(type, ()):
+            try:
+                if message is None:
                     message = self._build_message(type, **kwargs)
 
-                    if message:
-                        n.send(type, message)
+                if message:
+                    # The event log is written inline, everything else
+                    # goes through the outbox.
+                    if isinstance(n, LogNotification):
+                        n.send(type, message, **kwargs)
+                    else:
+                        ids.append(id)
+
+            except Exception, err:
+                errors.append('Error sending notification for {0}: {1}'.format(n.description, str(err)))
+
+        if ids:
+            try:
+                self._dispatcher.send(type, message, ids, event_id=event_id)
 
-                except Exception, err:
-                    errors.append('Error sending notification for {0}: {1}'.format(n.description, str(err)))
+            except Exception, err:
+                errors.append('Error queueing notifications: {0}'.format(str(err)))
 
         return errors
 
+    def stop(self):
+        self._dispatcher.stop()
+
     def refresh_notifier(self, id):
         n = Notification.query.filter_by(id=id).first()
         if n:
@@ -47,6 +80,8 @@ class NotificationSystem(object):
             except KeyError:
                 pass
 
+        self._index_subscriptions()
+
     def test_notifier(self, id):
         try:
             n = self._notifiers.get(id)
@@ -59,24 +94,70 @@ class NotificationSystem(object):
             return None
 
     def _init_notifiers(self):
-        self._notifiers = {-1: LogNotification()}   # Force LogNotification to always be present
+        self._notifiers.clear()
+        self._notifiers[-1] = LogNotification(self._log_writer)     # Force LogNotification to always be present
 
         for n in Notification.query.all():
             self._notifiers[n.id] = TYPE_MAP[n.type](n)
 
+        self._index_subscriptions()
+
+    def _index_subscriptions(self):
+        subscribers = {}
+
+        for id, n in self._notifiers.iteritems():
+            if not n:
+                continue
+
+            types = n.subscriptions
+            if types is None:
+                types = EVENT_TYPES.keys()
+
+            for type in types:
+                subscribers.setdefault(type, []).append((id, n))
+
+        self._subscribers = subscribers
+
+    def refresh_messages(self):
+        self._messages = None
+
+    def refresh_zones(self):
+        self._zone_names = None
+
     def _build_message(self, type, **kwargs):
-        message = NotificationMessage.query.filter_by(id=type).first()
-        if message:
-            message = message.text
+        if self._messages is None:
+            self._messages = {m.id: MessageTemplate(m.text) for m in NotificationMessage.query.all()}
+
+        message = self._messages.get(type)
+        if message is None:
+            return None
+
+        if 'zone' in kwargs and 'zone_name' in message.fields:
+            if self._zone_names is None:
+                self._zone_names = {z.zone_id: z.name for z in Zone.query.all()}
 
-        if 'zone' in kwargs:
-            zone_name = Zone.get_name(kwargs['zone'])
+            zone_name = self._zone_names.get(kwargs['zone'])
             kwargs['zone_name'] = zone_name if zone_name else '<unnamed>'
 
-        if message:
-            message = message.format(**kwargs)
+        return message.render(**kwargs)
+
+class MessageTemplate(object):
+    def __init__(self, text):
+        self.text = text
+        self.fields = set()
+
+        # Pre-parse the template so we know which lookups it needs.  Broken
+        # templates are left for render() to complain about.
+        try:
+            for literal, field, spec, conversion in Formatter().parse(text):
+                if field:
+                    self.fields.add(re.split('[.\\[]', field)[0])
+
+        except ValueError:
+            pass
 
-        return message
+    def render(self, **kwargs):
+        return self.text.format(**kwargs)
 
 class BaseNotification(object):
     def __init__(self, obj):
@@ -85,25 +166,41 @@ class BaseNotification(object):
         else:
             self._subscriptions = {}
 
-    def subscribes_to(self, type, value=None):
-        if type in self._subscriptions.keys():
-            return True
+    @property
+    def subscriptions(self):
+        return self._subscriptions.keys()
 
-        return False
+    def subscribes_to(self, type, value=None):
+        return type in self._subscriptions
 
 class LogNotification(object):
-    def __init__(self):
+    def __init__(self, writer):
         self.description = 'Logger'
+        self._writer = writer
+
+    @property
+    def subscriptions(self):
+        return None     # Everything
 
     def subscribes_to(self, type):
         return True
 
-    def send(self, type, text):
+    def send(self, type, text, **kwargs):
         with current_app.app_context():
             current_app.logger.info('Event: {0}'.format(text))
 
-        db.session.add(EventLogEntry(type=type, message=text))
-        db.session.commit()
+        self._writer.add(type, text,
+                            zone=self._to_int(kwargs.get('zone')),
+                            partition=self._to_int(kwargs.get('partition')),
+                            user=self._to_int(kwargs.get('user')),
+                            status=self._to_int(kwargs.get('status')))
+
+    def _to_int(self, value):
+        # Zones arrive as strings from some messages and statuses as bools.
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
 
 class EmailNotification(BaseNotification):
     def __init__(self, obj):
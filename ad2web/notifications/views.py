@@ -1,3 +1,5 @@
+import datetime
+
 from flask import (Blueprint, render_template, current_app, request, flash,
                     redirect, url_for, abort)
 from flask.ext.login import login_required, current_user
@@ -10,10 +12,11 @@ from .forms import (CreateNotificationForm, EditNotificationForm,
                     EditNotificationMessageForm,
                     EmailNotificationForm, GoogleTalkNotificationForm)
 
-from .models import Notification, NotificationSetting, NotificationMessage
+from .models import Notification, NotificationSetting, NotificationMessage, NotificationOutbox
 
 from .constants import (EVENT_TYPES, NOTIFICATION_TYPES, DEFAULT_SUBSCRIPTIONS, 
-                        EMAIL, GOOGLETALK)
+                        EMAIL, GOOGLETALK, OUTBOX_STATES, OUTBOX_PENDING,
+                        OUTBOX_SENDING, OUTBOX_FAILED)
 
 NOTIFICATION_TYPE_DETAILS = {
     'email': (EMAIL, EmailNotificationForm),
@@ -197,6 +200,8 @@ def edit_message(id):
         db.session.add(message)
         db.session.commit()
 
+        current_app.decoder.refresh_messages()
+
         flash('The notification message has been updated.', 'success')
 
         return redirect(url_for('notifications.messages'))
@@ -205,3 +210,51 @@ def edit_message(id):
                             form=form,
                             message_id=message.id,
                             active='notifications')
+
+@notifications.route('/outbox', methods=['GET'])
+@login_required
+def outbox():
+    if not current_user.is_admin():
+        abort(403)
+
+    entries = NotificationOutbox.query.filter(NotificationOutbox.state.in_([OUTBOX_PENDING, OUTBOX_SENDING, OUTBOX_FAILED])) \
+                                      .order_by(NotificationOutbox.created.desc()).all()
+    descriptions = dict((n.id, n.description) for n in Notification.query.all())
+
+    return render_template('notifications/outbox.html',
+                            entries=entries,
+                            descriptions=descriptions,
+                            states=OUTBOX_STATES,
+                            failed=OUTBOX_FAILED,
+                            active='notifications')
+
+@notifications.route('/outbox/retry/<int:id>', methods=['GET', 'POST'])
+@login_required
+def outbox_retry(id):
+    if not current_user.is_admin():
+        abort(403)
+
+    entry = NotificationOutbox.query.filter_by(id=id, state=OUTBOX_FAILED).first_or_404()
+    entry.state = OUTBOX_PENDING
+    entry.attempts = 0
+    entry.next_attempt = datetime.datetime.utcnow()
+
+    db.session.add(entry)
+    db.session.commit()
+
+    flash('The notification has been queued for delivery.', 'success')
+    return redirect(url_for('notifications.outbox'))
+
+@notifications.route('/outbox/remove/<int:id>', methods=['GET', 'POST'])
+@login_required
+def outbox_remove(id):
+    if not current_user.is_admin():
+        abort(403)
+
+    entry = NotificationOutbox.query.filter_by(id=id).first_or_404()
+
+    db.session.delete(entry)
+    db.session.commit()
+
+    flash('The notification has been removed from the outbox.', 'success')
+    return redirect(url_for('notifications.outbox'))
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+    JSON encoding of the data broadcast to websocket clients.
+"""
+
+import datetime
+
+import jsonpickle.pickler
+from alarmdecoder.messages import Message, LRRMessage, RFMessage, ExpanderMessage
+
+try:
+    import ujson as json_backend
+except ImportError:
+    try:
+        import simplejson as json_backend
+    except ImportError:
+        import json as json_backend
+
+PRIMITIVES = (basestring, int, long, float, bool, type(None))
+
+# Fields sent for each message type, the same ones jsonpickle picked up from
+# the instances so the pages see no difference.
+MESSAGE_FIELDS = {
+    Message: ('ac_power', 'alarm_event_occurred', 'alarm_sounding', 'armed_away', 'armed_home',
+              'backlight_on', 'battery_low', 'beeps', 'bitfield', 'check_zone', 'chime_on',
+              'entry_delay_off', 'fire_alarm', 'mask', 'numeric_code', 'panel_data',
+              'perimeter_only', 'programming_mode', 'raw', 'ready', 'system_fault', 'text',
+              'timestamp', 'zone_bypassed'),
+    LRRMessage: ('event_data', 'event_type', 'partition', 'raw', 'timestamp'),
+    RFMessage: ('battery', 'raw', 'serial_number', 'supervision', 'timestamp', 'value'),
+    ExpanderMessage: ('address', 'channel', 'raw', 'timestamp', 'type', 'value'),
+}
+
+# Compact encoding, for clients that ask for it when they connect.  Payloads
+# are sent as JSON values rather than encoded strings and device messages as
+# positional arrays starting with their kind; the client mirrors this schema
+# in alarmdecoder.js.
+ENCODINGS = ('json', 'compact')
+
+MESSAGE_KINDS = ('panel', 'lrr', 'rfx', 'exp')
+HEARTBEAT_KIND = len(MESSAGE_KINDS)
+
+# Keypad status flags, packed into a bitfield in this order.
+PANEL_STATUS_BITS = ('ready', 'armed_away', 'armed_home', 'backlight_on', 'programming_mode',
+                     'zone_bypassed', 'ac_power', 'chime_on', 'alarm_event_occurred',
+                     'alarm_sounding', 'battery_low', 'entry_delay_off', 'fire_alarm',
+                     'check_zone', 'perimeter_only', 'system_fault')
+
+# Fields following the kind in each message array.
+COMPACT_FIELDS = {
+    Message: ('beeps', 'numeric_code', 'text'),
+    LRRMessage: ('event_data', 'partition', 'event_type'),
+    RFMessage: ('serial_number', 'value'),
+    ExpanderMessage: ('address', 'channel', 'type', 'value'),
+}
+
+_serializers = {}
+
+
+def register(cls, serializer):
+    """
+    Registers the serializer used for instances of a class.
+
+    :param cls: Class to serialize
+    :type cls: type
+    :param serializer: Callable converting an instance into something
+                       made of dictionaries, lists and primitives.
+    :type serializer: callable
+    """
+    _serializers[cls] = serializer
+
+
+def field_serializer(fields):
+    """
+    Builds a serializer copying a fixed set of attributes.
+
+    :param fields: Attribute names
+    :type fields: tuple
+    """
+    def serialize(obj):
+        return dict((f, getattr(obj, f, None)) for f in fields)
+
+    return serialize
+
+
+def flatten(obj):
+    """
+    Converts an object into dictionaries, lists and primitives, using the
+    registered serializers and falling back to jsonpickle for anything else.
+
+    :param obj: Object to convert
+    :type obj: object
+    """
+    if isinstance(obj, PRIMITIVES):
+        return obj
+
+    if isinstance(obj, dict):
+        return dict((k, flatten(v)) for k, v in obj.iteritems())
+
+    if isinstance(obj, (list, tuple)):
+        return [flatten(v) for v in obj]
+
+    serializer = _find_serializer(type(obj))
+    if serializer is not None:
+        return flatten(serializer(obj))
+
+    return jsonpickle.pickler.Pickler(unpicklable=False).flatten(obj)
+
+
+def encode(obj):
+    """
+    Encodes an object as JSON.
+
+    :param obj: Object to encode
+    :type obj: object
+    :returns: The JSON string
+    """
+    return json_backend.dumps(flatten(obj))
+
+
+def compact(channel, data):
+    """
+    Converts broadcast data into the compact encoding.
+
+    :param channel: Websocket channel
+    :type channel: string
+    :param data: Data being broadcast
+    :type data: dict
+    """
+    if channel == 'message' and data.get('message_type') in MESSAGE_KINDS:
+        return compact_message(data)
+
+    return flatten(data)
+
+
+def compact_message(data):
+    """
+    Packs a device message broadcast into a positional array: the kind,
+    then for keypad messages the status bitfield, then the fields in
+    COMPACT_FIELDS.  Heartbeats become [HEARTBEAT_KIND, kind, repeats].
+
+    :param data: Message broadcast data
+    :type data: dict
+    """
+    kind = MESSAGE_KINDS.index(data['message_type'])
+    if data.get('heartbeat'):
+        return [HEARTBEAT_KIND, kind, data.get('repeats')]
+
+    message = data['message']
+    packed = [kind]
+
+    if isinstance(message, Message):
+        bits = 0
+        for i, name in enumerate(PANEL_STATUS_BITS):
+            if getattr(message, name, False):
+                bits |= 1 << i
+
+        packed.append(bits)
+
+    for cls, fields in COMPACT_FIELDS.iteritems():
+        if isinstance(message, cls):
+            packed.extend(getattr(message, f, None) for f in fields)
+            break
+
+    return packed
+
+
+def _find_serializer(cls):
+    serializer = _serializers.get(cls)
+    if serializer is None:
+        for base in cls.__mro__[1:]:
+            serializer = _serializers.get(base)
+            if serializer is not None:
+                # Remembered so subclasses only walk their bases once.
+                _serializers[cls] = serializer
+                break
+
+    return serializer
+
+
+for _cls, _fields in MESSAGE_FIELDS.iteritems():
+    register(_cls, field_serializer(_fields))
+
+register(datetime.datetime, str)
+register(datetime.date, str)
+register(set, list)
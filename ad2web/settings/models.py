@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import threading
+
 from OpenSSL import crypto, SSL
-from sqlalchemy import Column, orm
+from sqlalchemy import Column, orm, event
+from sqlalchemy.orm import attributes
 
 from ..extensions import db
 
@@ -15,7 +18,7 @@ class Setting(db.Model):
 
     @classmethod
     def get_by_name(cls, name, default=None):
-        setting = cls.query.filter_by(name=name).first()
+        setting = settings_cache.get(name)
         if not setting:
             setting = Setting(name=name)
             if default is not None:
@@ -53,4 +56,128 @@ class Setting(db.Model):
         if isinstance(other, Setting):
             val = other.value
 
-        return self.value != val
\ No newline at end of file
+        return self.value != val
+
+
+class SettingsCache(object):
+    """
+    Process-wide copy of the settings table.  All rows are loaded on the
+    first lookup and the copy is dropped whenever a session flushes or
+    bulk-modifies settings, and again once that transaction ends.
+    """
+
+    COLUMNS = ('id', 'name', 'int_value', 'string_value')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+        self._values = None
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Retrieves a setting attached to the current session without
+        querying the database, or None if there's no such setting.
+
+        :param name: Setting name
+        :type name: string
+        """
+        # Settings added but not flushed yet are only in the session.
+        for obj in db.session.new:
+            if isinstance(obj, Setting) and obj.name == name:
+                return obj
+
+        values = self._values
+        if values is None:
+            self.misses += 1
+            values = self._load()
+        else:
+            self.hits += 1
+
+        row = values.get(name)
+        if row is None:
+            return None
+
+        mapper = orm.class_mapper(Setting)
+        key = mapper.identity_key_from_primary_key([row['id']])
+        setting = db.session.identity_map.get(key)
+        if setting is not None:
+            # Fill in anything expired by a commit from the cache as well.
+            state = attributes.instance_state(setting)
+            for column in state.unloaded & set(row):
+                attributes.set_committed_value(setting, column, row[column])
+
+            return setting
+
+        # Build a clean, detached instance so the merge doesn't SELECT.
+        setting = mapper.class_manager.new_instance()
+        for column, value in row.iteritems():
+            attributes.set_committed_value(setting, column, value)
+        attributes.instance_state(setting).key = key
+
+        return db.session.merge(setting, load=False)
+
+    def invalidate(self):
+        """
+        Drops the cached rows.
+        """
+        with self._lock:
+            self._values = None
+
+    def stats(self):
+        """
+        Retrieves the cache statistics.
+
+        :returns: A dictionary with the hit and miss counts.
+        """
+        return {
+            'loaded': self._values is not None,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _load(self):
+        session = db.session()
+        rows = session.query(*[getattr(Setting, c) for c in self.COLUMNS]).all()
+        values = dict((r.name, dict(zip(self.COLUMNS, r))) for r in rows)
+
+        # Rows read after this transaction flushed its own setting changes
+        # aren't committed yet, so keep them out of the shared copy.
+        if not session.info.get('settings_changed'):
+            with self._lock:
+                self._values = values
+
+        return values
+
+
+settings_cache = SettingsCache()
+
+
+def _settings_changed(session):
+    session.info['settings_changed'] = True
+    settings_cache.invalidate()
+
+
+@event.listens_for(orm.Session, 'after_flush')
+def _after_flush(session, flush_context):
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Setting):
+            _settings_changed(session)
+            break
+
+
+@event.listens_for(orm.Session, 'after_bulk_update')
+@event.listens_for(orm.Session, 'after_bulk_delete')
+def _after_bulk(session, query, query_context, result):
+    if query.column_descriptions[0]['type'] is Setting:
+        _settings_changed(session)
+
+
+@event.listens_for(orm.Session, 'after_commit')
+@event.listens_for(orm.Session, 'after_rollback')
+def _after_transaction(session):
+    # Anything loaded while the transaction was open may have seen its
+    # uncommitted changes.
+    if session.info.pop('settings_changed', False):
+        settings_cache.invalidate()
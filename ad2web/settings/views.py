@@ -484,6 +484,7 @@ def import_backup():
 
                 db.session.commit()
 
+                current_app.decoder.refresh_zones()
                 _import_refresh()
 
                 current_app.logger.info('Successfully imported backup file.')
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import uuid
+
+from .notifications.constants import (ARM, DISARM, POWER_CHANGED, ALARM, ALARM_RESTORED,
+                                        FIRE, BYPASS, LOW_BATTERY, PANIC, RELAY_CHANGED,
+                                        ZONE_FAULT, ZONE_RESTORE)
+
+
+class PanelState(object):
+    """
+    Current state of the panel, built up from the decoder events.  Every
+    change bumps the version, so clients can tell whether what they have is
+    still current without fetching it again.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        # Versions restart at zero with the process, the epoch keeps ETags
+        # handed out before a restart from matching again.
+        self._epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+        self.version = 0
+        self.updated = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets everything known about the panel, for when the device is
+        closed or replaced.
+        """
+        with self._lock:
+            self._state = {
+                'connected': False,
+                'ready': None,
+                'armed': None,
+                'armed_home': None,
+                'ac_power': None,
+                'battery_low': None,
+                'alarm': False,
+                'alarm_zone': None,
+                'fire': None,
+                'bypass': None,
+                'panic': None,
+                'display': None,
+                'faulted_zones': [],
+                'relays': {},
+            }
+            self._changed()
+
+    def snapshot(self):
+        """
+        Retrieves a consistent copy of the state.
+
+        :returns: A dictionary of the state, with its version and update time.
+        """
+        with self._lock:
+            state = dict(self._state)
+            state['faulted_zones'] = list(self._state['faulted_zones'])
+            state['relays'] = dict(self._state['relays'])
+            state['version'] = self.version
+            state['updated'] = self.updated
+
+        return state
+
+    def etag(self, version=None):
+        """
+        Builds the entity tag for a version of the state.
+
+        :param version: State version, the current one if None.
+        :type version: int
+        """
+        if version is None:
+            version = self.version
+
+        return '{0}-{1}'.format(self._epoch, version)
+
+    def set_connected(self, connected):
+        """
+        Records whether the device is open.
+
+        :param connected: Whether the device is open.
+        :type connected: bool
+        """
+        self._update(connected=connected)
+
+    def update_message(self, message):
+        """
+        Updates the state from a keypad message.
+
+        :param message: Panel message
+        :type message: Message
+        """
+        self._update(ready=message.ready,
+                     armed_home=message.armed_home,
+                     display=message.text)
+
+    def update_event(self, ftype, **kwargs):
+        """
+        Updates the state from a decoder event.
+
+        :param ftype: Event type
+        :type ftype: int
+        :param kwargs: Event arguments
+        :type kwargs: dict
+        """
+        if ftype == ARM:
+            self._update(armed=True)
+        elif ftype == DISARM:
+            self._update(armed=False)
+        elif ftype == POWER_CHANGED:
+            self._update(ac_power=kwargs.get('status'))
+        elif ftype == ALARM:
+            self._update(alarm=True, alarm_zone=kwargs.get('zone'))
+        elif ftype == ALARM_RESTORED:
+            self._update(alarm=False, alarm_zone=None)
+        elif ftype == FIRE:
+            self._update(fire=kwargs.get('status'))
+        elif ftype == BYPASS:
+            self._update(bypass=kwargs.get('status'))
+        elif ftype == LOW_BATTERY:
+            self._update(battery_low=kwargs.get('status'))
+        elif ftype == PANIC:
+            self._update(panic=kwargs.get('status'))
+        elif ftype in (ZONE_FAULT, ZONE_RESTORE):
+            self._update_zone(kwargs.get('zone'), ftype == ZONE_FAULT)
+        elif ftype == RELAY_CHANGED:
+            message = kwargs.get('message')
+            if message is not None:
+                self._update_relay('{0}:{1}'.format(message.address, message.channel), message.value)
+
+    def _update(self, **values):
+        with self._lock:
+            changed = False
+            for key, value in values.iteritems():
+                if self._state[key] != value:
+                    self._state[key] = value
+                    changed = True
+
+            if changed:
+                self._changed()
+
+    def _update_zone(self, zone, faulted):
+        if zone is None:
+            return
+
+        with self._lock:
+            zones = self._state['faulted_zones']
+            if faulted and zone not in zones:
+                zones.append(zone)
+                zones.sort()
+                self._changed()
+            elif not faulted and zone in zones:
+                zones.remove(zone)
+                self._changed()
+
+    def _update_relay(self, relay, value):
+        with self._lock:
+            relays = self._state['relays']
+            if relays.get(relay) != value:
+                relays[relay] = value
+                self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self.updated = time.time()
@@ -2,6 +2,71 @@ var AlarmDecoder = function() {
     var AlarmDecoder = {};
     var _socket = null;
 
+    // 'compact' asks the server to send payloads as JSON values instead of
+    // encoded strings, and device messages as the positional arrays
+    // described in ad2web/serializers.py.
+    var _encoding = 'json';
+
+    var _message_kinds = ['panel', 'lrr', 'rfx', 'exp'];
+    var _panel_status_bits = ['ready', 'armed_away', 'armed_home', 'backlight_on', 'programming_mode',
+                              'zone_bypassed', 'ac_power', 'chime_on', 'alarm_event_occurred',
+                              'alarm_sounding', 'battery_low', 'entry_delay_off', 'fire_alarm',
+                              'check_zone', 'perimeter_only', 'system_fault'];
+    var _compact_fields = {
+        'panel': ['beeps', 'numeric_code', 'text'],
+        'lrr': ['event_data', 'partition', 'event_type'],
+        'rfx': ['serial_number', 'value'],
+        'exp': ['address', 'channel', 'type', 'value']
+    };
+
+    // Channels this page listens to.  The list is sent on every connect, so
+    // pages only receive what they've subscribed to.
+    var _topics = [];
+
+    // Packets sent to every client carry a sequence number.  After a
+    // reconnect we ask for everything after the last one we saw and hold new
+    // packets back until the answer arrives.
+    var _epoch = null;
+    var _seq = null;
+    var _resuming = false;
+    var _held = [];
+
+    var _channels = {
+        'message': function(obj) {
+            if ($.isArray(obj)) {
+                obj = _expand_message(obj);
+            }
+
+            if (obj.heartbeat) {
+                PubSub.publish('heartbeat', obj);
+                return;
+            }
+
+            msg = obj.message;
+            msg.message_type = obj.message_type;
+
+            PubSub.publish('message', msg);
+        },
+        'event': function(obj) {
+            PubSub.publish('event', obj);
+        },
+        'test': function(obj) {
+            PubSub.publish('test', obj);
+        },
+        'log': function(obj) {
+            PubSub.publish('log', obj);
+        },
+        'zone_status': function(obj) {
+            PubSub.publish('zone_status', obj);
+        },
+        'device_open': function(obj) {
+            PubSub.publish('device_open', obj);
+        },
+        'device_close': function(obj) {
+            PubSub.publish('device_close', obj);
+        }
+    };
+
     AlarmDecoder.init = function() {
         this.connect("/alarmdecoder");
     };
@@ -13,50 +78,209 @@ var AlarmDecoder = function() {
             'max reconnection attempts': Infinity,
         });
 
-        _socket.on('connect', function() { });
-        _socket.on('disconnect', function() { });
+        _socket.on('connect', function() {
+            _socket.emit('encoding', _encoding);
+            _socket.emit('subscribe', _topics);
+            _resume();
 
-        _socket.on('message', function(msg) {
-            obj = JSON.parse(msg);
+            PubSub.publish('connect', {});
+        });
+        _socket.on('disconnect', function() { });
 
-            msg = obj.message;
-            msg.message_type = obj.message_type;
+        _socket.on('resume', function(msg) {
+            _resumed(typeof msg == 'string' ? JSON.parse(msg) : msg);
+        });
 
-            PubSub.publish('message', msg);
+        $.each(_channels, function(name, handler) {
+            _socket.on(name, function(msg, seq) {
+                _receive(name, msg, seq);
+            });
         });
+    };
 
-        _socket.on('event', function(msg) {
-            obj = JSON.parse(msg);
+    AlarmDecoder.disconnect = function() {
+        _socket.disconnect();
+    };
 
-            PubSub.publish('event', obj);
-        });
+    AlarmDecoder.emit = function(type, arg) {
+        _socket.emit(type, arg);
+    };
 
-        _socket.on('test', function(msg) {
-            obj = JSON.parse(msg);
+    AlarmDecoder.setEncoding = function(encoding) {
+        if (encoding != _encoding) {
+            _encoding = encoding;
+            _socket.emit('encoding', encoding);
+        }
+    };
 
-            PubSub.publish('test', obj);
+    AlarmDecoder.subscribe = function(topic) {
+        if ($.inArray(topic, _topics) == -1) {
+            _topics.push(topic);
+            _socket.emit('subscribe', topic);
+        }
+    };
+
+    AlarmDecoder.unsubscribe = function(topic) {
+        var index = $.inArray(topic, _topics);
+
+        if (index != -1) {
+            _topics.splice(index, 1);
+            _socket.emit('unsubscribe', topic);
+        }
+    };
+
+    var _receive = function(name, msg, seq) {
+        if (seq === undefined) {
+            _dispatch(name, msg);
+        }
+        else if (_resuming) {
+            _held.push([seq, name, msg]);
+        }
+        else if (_seq === null || seq > _seq) {
+            _seq = seq;
+            _dispatch(name, msg);
+        }
+    };
+
+    var _resume = function() {
+        _resuming = true;
+        _socket.emit('resume', _epoch, _seq);
+    };
+
+    var _resumed = function(reply) {
+        var packets = _held.concat(reply.packets || []);
+
+        _held = [];
+        _resuming = false;
+        _epoch = reply.epoch;
+
+        // Whatever happened up to the reply is part of the snapshot.
+        if (reply.snapshot) {
+            _seq = reply.seq;
+            PubSub.publish('snapshot', reply.snapshot);
+        }
+
+        packets.sort(function(a, b) { return a[0] - b[0]; });
+        $.each(packets, function(i, packet) {
+            if (_seq === null || packet[0] > _seq) {
+                _seq = packet[0];
+                _dispatch(packet[1], packet[2]);
+            }
         });
 
-        _socket.on('device_open', function(msg) {
-            obj = JSON.parse(msg)
+        if (_seq === null || reply.seq > _seq) {
+            _seq = reply.seq;
+        }
+    };
 
-            PubSub.publish('device_open', obj);
+    var _dispatch = function(name, msg) {
+        var handler = _channels[name];
+
+        if (handler) {
+            handler(typeof msg == 'string' ? JSON.parse(msg) : msg);
+        }
+    };
+
+    var _expand_message = function(packed) {
+        var kind = packed[0];
+
+        if (kind == _message_kinds.length) {
+            return { message_type: _message_kinds[packed[1]], heartbeat: true, repeats: packed[2] };
+        }
+
+        var message_type = _message_kinds[kind];
+        var message = {};
+        var i = 1;
+
+        if (message_type == 'panel') {
+            var bits = packed[i++];
+            $.each(_panel_status_bits, function(bit, name) {
+                message[name] = (bits & (1 << bit)) != 0;
+            });
+        }
+
+        $.each(_compact_fields[message_type], function(j, name) {
+            message[name] = packed[i++];
         });
 
-        _socket.on('device_close', function(msg) {
-            obj = JSON.parse(msg)
+        if (message_type == 'rfx') {
+            message.battery = (message.value & 0x02) != 0;
+            message.supervision = (message.value & 0x04) != 0;
+        }
 
-            PubSub.publish('device_close', obj);
+        return { message: message, message_type: message_type };
+    };
+
+    return AlarmDecoder;
+};
+
+// Client copy of the zone status table.  The full table is fetched once and
+// then kept current from the 'zone_status' diffs; if a diff doesn't follow on
+// from the version we hold, only the zones changed since are fetched again.
+// Subscribers to 'zone_changed' get one row per zone that actually moved.
+var ZoneStatus = function() {
+    var ZoneStatus = {};
+    var _version = null;
+    var _fields = null;
+    var _pending = [];
+
+    ZoneStatus.zones = {};
+
+    ZoneStatus.init = function(decoder) {
+        decoder.subscribe('zone_status');
+
+        PubSub.subscribe('snapshot', function(type, snapshot) {
+            _fields = snapshot.zones.fields;
+            _apply(snapshot.zones.version, snapshot.zones.zones);
+        });
+
+        PubSub.subscribe('zone_status', function(type, diff) {
+            if (_version === null) {
+                _pending.push(diff);
+            }
+            else if (diff.since == _version) {
+                _apply(diff.version, diff.zones);
+            }
+            else if (diff.version > _version) {
+                _fetch(_version);
+            }
         });
+
+        _fetch(0);
     };
 
-    AlarmDecoder.disconnect = function() {
-        _socket.disconnect();
+    var _fetch = function(since) {
+        $.getJSON('/api/zones/status', { since: since }, function(data) {
+            _fields = data.fields;
+            _apply(data.version, data.zones);
+
+            var pending = _pending;
+            _pending = [];
+            $.each(pending, function(i, diff) {
+                if (diff.since > _version) {
+                    _fetch(_version);
+                    return false;
+                }
+                else if (diff.version > _version) {
+                    _apply(diff.version, diff.zones);
+                }
+            });
+        });
     };
 
-    AlarmDecoder.emit = function(type, arg) {
-        _socket.emit(type, arg);
+    var _apply = function(version, rows) {
+        _version = version;
+
+        $.each(rows, function(i, row) {
+            var zone = {};
+            $.each(_fields, function(j, field) {
+                zone[field] = row[j];
+            });
+
+            ZoneStatus.zones[zone.zone] = zone;
+            PubSub.publish('zone_changed', zone);
+        });
     };
 
-    return AlarmDecoder;
+    return ZoneStatus;
 };
@@ -1 +1,4 @@
 # -*- coding: utf-8 -*-
+
+# Largest zone number supported by the panels we talk to.
+MAX_ZONES = 250
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from array import array
+
+from .constants import MAX_ZONES
+
+FIELDS = ('zone', 'faulted', 'last_fault', 'last_restore', 'faults')
+
+
+class ZoneStatusTable(object):
+    """
+    Fault state of every zone, kept in flat arrays indexed by zone number.
+    Each zone remembers the table version it last changed in, so clients
+    holding an older copy can ask for just the zones that moved since, and
+    every change comes back as a diff to pass on to them.
+    """
+
+    def __init__(self, max_zones=MAX_ZONES):
+        """
+        Constructor
+
+        :param max_zones: Highest zone number tracked.
+        :type max_zones: int
+        """
+        size = max_zones + 1
+
+        self.max_zones = max_zones
+        self.version = 0
+
+        self._faulted = bytearray(size)
+        self._last_fault = array('d', [0.0]) * size
+        self._last_restore = array('d', [0.0]) * size
+        self._faults = array('L', [0]) * size
+        self._versions = array('L', [0]) * size
+        self._lock = threading.Lock()
+
+    def fault(self, zone, timestamp=None):
+        """
+        Marks a zone as faulted.
+
+        :param zone: Zone number
+        :type zone: int
+        :param timestamp: Time of the fault, now if None.
+        :type timestamp: float
+        :returns: The diff if the zone changed, None otherwise.
+        """
+        return self._set(zone, True, timestamp)
+
+    def restore(self, zone, timestamp=None):
+        """
+        Marks a zone as restored.
+
+        :param zone: Zone number
+        :type zone: int
+        :param timestamp: Time of the restore, now if None.
+        :type timestamp: float
+        :returns: The diff if the zone changed, None otherwise.
+        """
+        return self._set(zone, False, timestamp)
+
+    def clear(self):
+        """
+        Restores every faulted zone without recording a restore, for when
+        the device goes away and their state is no longer known.
+
+        :returns: The diff if any zone changed, None otherwise.
+        """
+        with self._lock:
+            since = self.version
+            rows = []
+            for zone in range(1, self.max_zones + 1):
+                if self._faulted[zone]:
+                    self._faulted[zone] = 0
+                    rows.append(self._touch(zone))
+
+            return self._diff(since, rows) if rows else None
+
+    def rows(self, since=0):
+        """
+        Retrieves the zones that changed after a version of the table.
+        Zones that never had any activity are left out.
+
+        :param since: Table version the caller already has.
+        :type since: int
+        :returns: The current version and a list of rows.
+        """
+        with self._lock:
+            versions = self._versions
+            rows = [self._row(z) for z in range(1, self.max_zones + 1) if versions[z] > since]
+
+            return self.version, rows
+
+    def _set(self, zone, faulted, timestamp):
+        try:
+            zone = int(zone)
+        except (TypeError, ValueError):
+            return None
+
+        if not 0 < zone <= self.max_zones:
+            return None
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            if bool(self._faulted[zone]) == faulted:
+                return None
+
+            since = self.version
+
+            self._faulted[zone] = faulted
+            if faulted:
+                self._last_fault[zone] = timestamp
+                self._faults[zone] += 1
+            else:
+                self._last_restore[zone] = timestamp
+
+            return self._diff(since, [self._touch(zone)])
+
+    def _diff(self, since, rows):
+        return {'since': since, 'version': self.version, 'zones': rows}
+
+    def _touch(self, zone):
+        self.version += 1
+        self._versions[zone] = self.version
+
+        return self._row(zone)
+
+    def _row(self, zone):
+        return (zone,
+                bool(self._faulted[zone]),
+                self._last_fault[zone] or None,
+                self._last_restore[zone] or None,
+                self._faults[zone])
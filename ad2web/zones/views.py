@@ -38,6 +38,8 @@ def create():
         db.session.add(zone)
         db.session.commit()
 
+        current_app.decoder.refresh_zones()
+
         flash('Zone created.', 'success')
 
         return redirect(url_for('zones.index'))
@@ -59,6 +61,8 @@ def edit(id):
         db.session.add(zone)
         db.session.commit()
 
+        current_app.decoder.refresh_zones()
+
         flash('Zone updated.', 'success')
 
     use_ssl = Setting.get_by_name('use_ssl', default=False).value
@@ -72,7 +76,9 @@ def remove(id):
     zone = Zone.query.filter_by(zone_id=id).first_or_404()
     db.session.delete(zone)
     db.session.commit();
-    
+
+    current_app.decoder.refresh_zones()
+
     flash('Zone deleted.', 'success')
 
     return redirect(url_for('zones.index'))
@@ -0,0 +1,57 @@
+"""Added structured event_log columns.
+
+Revision ID: 1f7b2c9e4d55
+Revises: 3e8f5a1c7b20
+Create Date: 2014-11-12 10:05:51.330472
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f7b2c9e4d55'
+down_revision = '3e8f5a1c7b20'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('event_log', sa.Column('zone', sa.Integer(), nullable=True))
+    op.add_column('event_log', sa.Column('partition', sa.SmallInteger(), nullable=True))
+    op.add_column('event_log', sa.Column('user', sa.Integer(), nullable=True))
+    op.add_column('event_log', sa.Column('status', sa.SmallInteger(), nullable=True))
+    op.create_index('ix_event_log_type_timestamp', 'event_log', ['type', 'timestamp'])
+    op.create_index('ix_event_log_zone_timestamp', 'event_log', ['zone', 'timestamp'])
+
+def downgrade():
+    op.drop_index('ix_event_log_zone_timestamp')
+    op.drop_index('ix_event_log_type_timestamp')
+
+    # SQLite only learned DROP COLUMN in 3.35, so the table is rebuilt without
+    # the structured columns instead.  Dropping it takes its remaining index
+    # and the full-text triggers with it; both are put back afterwards.
+    fts = op.get_bind().execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='event_log_fts'").scalar()
+
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_insert")
+
+    op.create_table('event_log_old',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.SmallInteger(), nullable=False),
+        sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.func.current_timestamp(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO event_log_old (id, type, timestamp, message) SELECT id, type, timestamp, message FROM event_log")
+    op.drop_table('event_log')
+    op.rename_table('event_log_old', 'event_log')
+    op.create_index('ix_event_log_timestamp', 'event_log', ['timestamp'])
+
+    if fts:
+        op.execute("CREATE TRIGGER event_log_fts_insert AFTER INSERT ON event_log BEGIN "
+                    "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END")
+        op.execute("CREATE TRIGGER event_log_fts_delete AFTER DELETE ON event_log BEGIN "
+                    "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); END")
+        op.execute("CREATE TRIGGER event_log_fts_update AFTER UPDATE OF message ON event_log BEGIN "
+                    "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+                    "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END")
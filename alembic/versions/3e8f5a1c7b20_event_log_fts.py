@@ -0,0 +1,37 @@
+"""Added event_log full-text index.
+
+Revision ID: 3e8f5a1c7b20
+Revises: 4a6c2e9d1b73
+Create Date: 2014-11-10 14:22:37.604118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3e8f5a1c7b20'
+down_revision = '4a6c2e9d1b73'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # SQLite builds without FTS5 keep searching with LIKE.
+    try:
+        op.execute("CREATE VIRTUAL TABLE event_log_fts USING fts5(message, content='event_log', content_rowid='id')")
+    except sa.exc.DBAPIError:
+        return
+
+    op.execute("CREATE TRIGGER event_log_fts_insert AFTER INSERT ON event_log BEGIN "
+                "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END")
+    op.execute("CREATE TRIGGER event_log_fts_delete AFTER DELETE ON event_log BEGIN "
+                "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); END")
+    op.execute("CREATE TRIGGER event_log_fts_update AFTER UPDATE OF message ON event_log BEGIN "
+                "INSERT INTO event_log_fts(event_log_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+                "INSERT INTO event_log_fts(rowid, message) VALUES (new.id, new.message); END")
+    op.execute("INSERT INTO event_log_fts(event_log_fts) VALUES ('rebuild')")
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS event_log_fts_insert")
+    op.execute("DROP TABLE IF EXISTS event_log_fts")
@@ -0,0 +1,41 @@
+"""Added notification outbox.
+
+Revision ID: 4a6c2e9d1b73
+Revises: 2d5cbdadf755
+Create Date: 2014-11-03 09:41:12.118034
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4a6c2e9d1b73'
+down_revision = '2d5cbdadf755'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('notification_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.SmallInteger(), nullable=True),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('state', sa.SmallInteger(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created', sa.DateTime(), nullable=True),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    op.create_index('ix_notification_outbox_notification_id', 'notification_outbox', ['notification_id'])
+    op.create_index('ix_notification_outbox_state', 'notification_outbox', ['state'])
+    op.create_index('ix_notification_outbox_next_attempt', 'notification_outbox', ['next_attempt'])
+
+def downgrade():
+    op.drop_index('ix_notification_outbox_next_attempt')
+    op.drop_index('ix_notification_outbox_state')
+    op.drop_index('ix_notification_outbox_notification_id')
+    op.drop_table('notification_outbox')
@@ -0,0 +1,41 @@
+"""Added event_log rollup tables.
+
+Revision ID: 5c0d8e3b6a91
+Revises: 1f7b2c9e4d55
+Create Date: 2014-11-14 16:48:03.917725
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5c0d8e3b6a91'
+down_revision = '1f7b2c9e4d55'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('event_log_hourly',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.DateTime(), nullable=False),
+    sa.Column('type', sa.SmallInteger(), nullable=False),
+    sa.Column('zone', sa.Integer(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_event_log_hourly_period', 'event_log_hourly', ['period', 'type', 'zone'])
+    op.create_table('event_log_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('type', sa.SmallInteger(), nullable=False),
+    sa.Column('zone', sa.Integer(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_event_log_daily_period', 'event_log_daily', ['period', 'type', 'zone'])
+
+def downgrade():
+    op.drop_index('ix_event_log_daily_period')
+    op.drop_table('event_log_daily')
+    op.drop_index('ix_event_log_hourly_period')
+    op.drop_table('event_log_hourly')
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+    Cost of encoding each kind of device message for a broadcast, with
+    jsonpickle and with the serializer registry.
+
+    Usage: python contrib/benchmarks/message_encoding.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+import jsonpickle
+from alarmdecoder.messages import Message, LRRMessage, RFMessage, ExpanderMessage
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'ad2web'))
+import serializers
+
+MESSAGES = [
+    ('panel', Message('[0000000110000000----],010,[f70000051010000c18020000000000],"DISARMED CHIME   Ready to Arm  "')),
+    ('lrr', LRRMessage('!LRR:012,1,CID_1441')),
+    ('rfx', RFMessage('!RFX:0180036,80')),
+    ('exp', ExpanderMessage('!EXP:07,01,01')),
+]
+
+
+def bench(encode, data, iterations):
+    """Microseconds per encode, best of three runs."""
+    timer = timeit.Timer(lambda: encode(data))
+
+    return min(timer.repeat(3, iterations)) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    print 'JSON backend: {0}'.format(serializers.json_backend.__name__)
+    print '{0:<8} {1:>16} {2:>16} {3:>10}'.format('type', 'jsonpickle us', 'registry us', 'speedup')
+    for ftype, message in MESSAGES:
+        data = {'message': message, 'message_type': ftype}
+
+        before = bench(lambda d: jsonpickle.encode(d, unpicklable=False), data, iterations)
+        after = bench(serializers.encode, data, iterations)
+        print '{0:<8} {1:>16.1f} {2:>16.1f} {3:>9.1f}x'.format(ftype, before, after, before / after)
+
+
+if __name__ == '__main__':
+    main()
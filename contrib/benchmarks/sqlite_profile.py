@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+    Event log throughput with the default SQLite settings and with the
+    tuning profile from DefaultConfig.
+
+    Usage: python contrib/benchmarks/sqlite_profile.py [events] [seconds]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool, QueuePool
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'ad2web'))
+from config import DefaultConfig
+from database import sqlite_pragmas, apply_sqlite_pragmas
+
+SCHEMA = [
+    'CREATE TABLE event_log (id INTEGER PRIMARY KEY, type SMALLINT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, message TEXT NOT NULL)',
+    'CREATE INDEX ix_event_log_timestamp ON event_log (timestamp)',
+]
+
+INSERT = 'INSERT INTO event_log (type, timestamp, message) VALUES (?, ?, ?)'
+PAGE = 'SELECT id, type, timestamp, message FROM event_log ORDER BY timestamp DESC LIMIT 10 OFFSET 0'
+
+
+def make_engine(path, tuned):
+    if not tuned:
+        return create_engine('sqlite:///' + path, poolclass=NullPool)
+
+    engine = create_engine('sqlite:///' + path, poolclass=QueuePool,
+                            pool_size=DefaultConfig.SQLALCHEMY_POOL_SIZE,
+                            connect_args={'check_same_thread': False})
+    pragmas = sqlite_pragmas(vars(DefaultConfig))
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return engine
+
+
+def row(i):
+    return (8, datetime.datetime.utcnow(), 'Zone Front Door ({0}) has been faulted.'.format(i % 128))
+
+
+def bench_inserts(engine, count):
+    """One transaction per event, the way LogNotification used to work."""
+    start = time.time()
+    for i in range(count):
+        conn = engine.connect()
+        conn.execute(INSERT, row(i))
+        conn.close()
+
+    return count / (time.time() - start)
+
+
+def bench_mixed(engine, duration):
+    """A writer committing events while a reader pages the event log."""
+    counts = {'writes': 0, 'reads': 0}
+    stop = time.time() + duration
+
+    def writer():
+        i = 0
+        while time.time() < stop:
+            conn = engine.connect()
+            conn.execute(INSERT, row(i))
+            conn.close()
+            counts['writes'] += 1
+            i += 1
+
+    def reader():
+        while time.time() < stop:
+            conn = engine.connect()
+            conn.execute(PAGE).fetchall()
+            conn.close()
+            counts['reads'] += 1
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return counts['writes'] / float(duration), counts['reads'] / float(duration)
+
+
+def run(tuned, events, duration):
+    folder = tempfile.mkdtemp()
+    try:
+        engine = make_engine(os.path.join(folder, 'db.sqlite'), tuned)
+        for statement in SCHEMA:
+            engine.execute(statement)
+
+        inserts = bench_inserts(engine, events)
+        writes, reads = bench_mixed(engine, duration)
+        engine.dispose()
+    finally:
+        shutil.rmtree(folder)
+
+    return inserts, writes, reads
+
+
+def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    duration = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print '{0:<10} {1:>14} {2:>14} {3:>14}'.format('profile', 'inserts/s', 'mixed writes/s', 'mixed reads/s')
+    for name, tuned in (('default', False), ('tuned', True)):
+        inserts, writes, reads = run(tuned, events, duration)
+        print '{0:<10} {1:>14.1f} {2:>14.1f} {3:>14.1f}'.format(name, inserts, writes, reads)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,7 +22,7 @@ class TestCase(Base):
     def create_app(self):
         """Create and return a testing flask app."""
 
-        app = create_app(TestConfig)
+        app, appsocket = create_app(TestConfig)
         self.twill = Twill(app, port=3000)
         return app
 
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import json
+from unittest import TestCase
+
+from gevent.queue import Queue
+
+from ad2web.broadcast import Broadcaster, ReplayBuffer, DROP_OLDEST, DROP_NEWEST, EVICT
+
+
+class FakeSocket(object):
+
+    def __init__(self, sessid):
+        self.sessid = sessid
+        self.connected = True
+        self.killed = False
+        self.client_queue = Queue()
+
+    def put_client_msg(self, msg):
+        self.client_queue.put_nowait(msg)
+
+    def kill(self):
+        self.killed = True
+        self.connected = False
+
+
+class FakeServer(object):
+
+    def __init__(self, *sessions):
+        self.sockets = dict((s, FakeSocket(s)) for s in sessions)
+
+
+class TestBroadcaster(TestCase):
+
+    def _publish(self, server, policy, count):
+        broadcaster = Broadcaster(server, queue_size=2, policy=policy, high_water=0)
+        for i in range(count):
+            broadcaster.publish(dict(type='event', name='test', args=str(i), endpoint='/alarmdecoder'))
+
+        return broadcaster
+
+    def _queued(self, broadcaster, session):
+        # Encoded as '5::<endpoint>:<json>'; the args are the publish order.
+        queue = broadcaster._clients[session]._queue
+        return [json.loads(queue.get_nowait().split(':', 3)[3])['args'] for i in range(queue.qsize())]
+
+    def test_drop_oldest(self):
+        broadcaster = self._publish(FakeServer('a'), DROP_OLDEST, 5)
+
+        stats = broadcaster.stats()[0]
+        assert stats['queued'] == 2
+        assert stats['dropped'] == 3
+
+        assert self._queued(broadcaster, 'a') == ['3', '4']
+        broadcaster.stop()
+
+    def test_drop_newest(self):
+        broadcaster = self._publish(FakeServer('a'), DROP_NEWEST, 5)
+
+        stats = broadcaster.stats()[0]
+        assert stats['queued'] == 2
+        assert stats['dropped'] == 3
+
+        assert self._queued(broadcaster, 'a') == ['0', '1']
+        broadcaster.stop()
+
+    def test_evict(self):
+        server = FakeServer('a')
+        broadcaster = self._publish(server, EVICT, 5)
+
+        assert server.sockets['a'].killed
+        broadcaster.stop()
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, Broadcaster, FakeServer(), policy='bogus')
+
+    def test_subscriptions(self):
+        server = FakeServer('all', 'messages', 'none')
+        broadcaster = Broadcaster(server, queue_size=10, high_water=0)
+        broadcaster.subscribe('messages', ['message'])
+        broadcaster.subscribe('none', [])
+
+        broadcaster.publish(dict(type='event', name='message', args='1', endpoint='/alarmdecoder'))
+        broadcaster.publish(dict(type='event', name='event', args='2', endpoint='/alarmdecoder'))
+
+        queued = dict((s['session'], s['queued']) for s in broadcaster.stats())
+        assert queued == {'all': 2, 'messages': 1, 'none': 0}
+        assert broadcaster.wants('all', 'event')
+        assert not broadcaster.wants('messages', 'event')
+
+        broadcaster.unsubscribe('messages', ['message'])
+        assert not broadcaster.wants('messages', 'message')
+
+        del server.sockets['messages']
+        broadcaster.stats()
+        assert broadcaster.wants('messages', 'event')
+        broadcaster.stop()
+
+    def test_compact_encoding(self):
+        server = FakeServer('json', 'compact')
+        broadcaster = Broadcaster(server, queue_size=10, high_water=0)
+        broadcaster.set_encoding('compact', 'compact')
+
+        built = []
+        def compact():
+            built.append(True)
+            return dict(type='event', name='message', args=[[0, 1]], endpoint='/alarmdecoder')
+
+        broadcaster.publish(dict(type='event', name='message', args='{}', endpoint='/alarmdecoder'), compact=compact)
+        broadcaster.publish(dict(type='event', name='message', args='{}', endpoint='/alarmdecoder'),
+                            sessions=['json'], compact=compact)
+
+        assert len(built) == 1
+        queued = dict((s['session'], s['queued']) for s in broadcaster.stats())
+        assert queued == {'json': 2, 'compact': 1}
+        broadcaster.stop()
+
+
+class TestReplayBuffer(TestCase):
+
+    def _packet(self, i):
+        return dict(type='event', name='event', args=str(i), endpoint='/alarmdecoder')
+
+    def test_sequence(self):
+        replay = ReplayBuffer(size=3)
+        packet = replay.sequence(self._packet(0))
+
+        self.assertEqual(packet['args'], ['0', 1])
+        self.assertEqual(replay.seq, 1)
+
+    def test_since(self):
+        replay = ReplayBuffer(size=3)
+        for i in range(5):
+            replay.sequence(self._packet(i))
+
+        self.assertEqual(replay.since(replay.epoch, 3), [[4, 'event', '3'], [5, 'event', '4']])
+        self.assertEqual(replay.since(replay.epoch, 2), [[3, 'event', '2'], [4, 'event', '3'], [5, 'event', '4']])
+        self.assertEqual(replay.since(replay.epoch, 5), [])
+        self.assertIsNone(replay.since(replay.epoch, 1))
+        self.assertIsNone(replay.since(replay.epoch, 6))
+        self.assertIsNone(replay.since('other', 4))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+import gevent
+
+from ad2web.coalesce import MessageCoalescer
+
+
+class FakeMessage(object):
+
+    def __init__(self, raw, serial_number=None, mask=None):
+        self.raw = raw
+        self.serial_number = serial_number
+        self.mask = mask
+
+
+class TestMessageCoalescer(TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def _send(self, ftype, message, repeats=None):
+        self.sent.append((ftype, message.raw if message else 'heartbeat', repeats))
+        return 10
+
+    def test_suppress_repeats(self):
+        coalescer = MessageCoalescer(self._send, window=0, heartbeat=0)
+        for raw in ['a', 'a', 'a', 'b', 'b', 'a']:
+            coalescer.add('panel', FakeMessage(raw))
+
+        self.assertEqual([s[1] for s in self.sent], ['a', 'b', 'a'])
+
+        stats = coalescer.stats()['panel']
+        self.assertEqual(stats['received'], 6)
+        self.assertEqual(stats['suppressed'], 3)
+        self.assertEqual(stats['saved_bytes'], 30)
+
+    def test_heartbeat(self):
+        coalescer = MessageCoalescer(self._send, window=0, heartbeat=0.01)
+        coalescer.add('panel', FakeMessage('a'))
+        coalescer.add('panel', FakeMessage('a'))
+        gevent.sleep(0.02)
+        coalescer.add('panel', FakeMessage('a'))
+
+        self.assertEqual(self.sent, [('panel', 'a', None), ('panel', 'heartbeat', 2)])
+
+    def test_lrr_repeats_sent(self):
+        coalescer = MessageCoalescer(self._send, window=0.02, heartbeat=0)
+        for raw in ['a', 'a', 'a']:
+            coalescer.add('lrr', FakeMessage(raw))
+
+        self.assertEqual(self.sent, [('lrr', 'a', None)] * 3)
+        self.assertEqual(coalescer.stats()['lrr']['suppressed'], 0)
+
+    def test_panel_keyed_by_mask(self):
+        coalescer = MessageCoalescer(self._send, window=0.02, heartbeat=0)
+        coalescer.add('panel', FakeMessage('p1', mask=1))
+        coalescer.add('panel', FakeMessage('p2', mask=2))
+        coalescer.add('panel', FakeMessage('p3', mask=4))
+        coalescer.add('panel', FakeMessage('p4', mask=2))
+
+        gevent.sleep(0.03)
+        self.assertEqual([s[1] for s in self.sent], ['p1', 'p4', 'p3'])
+        self.assertEqual(coalescer.stats()['panel']['merged'], 1)
+        self.assertEqual(sorted(m.raw for m in coalescer.latest('panel')), ['p1', 'p3', 'p4'])
+        coalescer.stop()
+
+    def test_merge_burst(self):
+        coalescer = MessageCoalescer(self._send, window=0.02, heartbeat=0)
+        for raw in ['1', '2', '3']:
+            coalescer.add('rfx', FakeMessage('x' + raw, serial_number='x'))
+        coalescer.add('rfx', FakeMessage('y', serial_number='y'))
+
+        self.assertEqual([s[1] for s in self.sent], ['x1'])
+
+        gevent.sleep(0.03)
+        self.assertEqual([s[1] for s in self.sent], ['x1', 'x3', 'y'])
+        self.assertEqual(coalescer.stats()['rfx']['merged'], 1)
+        self.assertEqual(sorted(m.raw for m in coalescer.latest('rfx')), ['x3', 'y'])
+        coalescer.stop()
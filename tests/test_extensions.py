@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from flask import Flask
+from sqlalchemy.pool import QueuePool
+
+from ad2web.config import DefaultConfig
+from ad2web.extensions import db
+
+
+class TestDriverHacks(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _engine(self, uri):
+        # A bare app with the default pool settings, so no decoder threads
+        # are started.
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+        app.config['SQLALCHEMY_POOL_SIZE'] = DefaultConfig.SQLALCHEMY_POOL_SIZE
+        app.config['SQLALCHEMY_POOL_TIMEOUT'] = DefaultConfig.SQLALCHEMY_POOL_TIMEOUT
+        db.init_app(app)
+
+        with app.app_context():
+            return db.get_engine(app)
+
+    def test_in_memory_database(self):
+        engine = self._engine('sqlite://')
+
+        assert not isinstance(engine.pool, QueuePool)
+        assert engine.execute('SELECT 1').scalar() == 1
+
+    def test_file_database(self):
+        engine = self._engine('sqlite:///' + os.path.join(self.folder, 'db.sqlite'))
+
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == DefaultConfig.SQLALCHEMY_POOL_SIZE
+        assert engine.execute('SELECT 1').scalar() == 1
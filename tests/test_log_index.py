@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ad2web.log.index import FileIndex, LogIndex, level_mask, ALL_LEVELS
+
+
+def entry(minute, second, level, text):
+    return '2026-10-16 12:{0:02d}:{1:02d},000 {2}: {3}\n'.format(minute, second, level, text).encode('utf-8')
+
+
+def messages(results):
+    return [r.split(': ', 1)[1].split('\n')[0] for r in results]
+
+
+class TestFileIndex(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'info.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _update(self, index):
+        with open(self.path, 'rb') as f:
+            index.update(f)
+
+    def test_level_mask(self):
+        assert level_mask(None) == ALL_LEVELS
+        assert level_mask('error') == level_mask('ERROR') == 8 | 16
+        assert level_mask('debug') == ALL_LEVELS
+
+    def test_minutes_and_levels(self):
+        with open(self.path, 'wb') as f:
+            f.write(entry(0, 1, 'INFO', 'a'))
+            f.write(entry(0, 2, 'ERROR', 'b'))
+            f.write(b'Traceback (most recent call last):\n')
+            f.write(entry(1, 0, 'DEBUG', 'c'))
+            f.write(entry(2, 0, 'INFO', 'd'))
+
+        index = FileIndex()
+        self._update(index)
+
+        assert index.keys == ['2026-10-16 12:00', '2026-10-16 12:01', '2026-10-16 12:02']
+        assert index.masks == [2 | 8, 1, 2]
+        assert index.size == os.path.getsize(self.path)
+
+        assert index.ranges() == [(0, index.size)]
+        assert index.ranges(mask=level_mask('ERROR')) == [(0, index.offsets[1])]
+        assert index.ranges(since='2026-10-16 12:01', until='2026-10-16 12:01') == [(index.offsets[1], index.offsets[2])]
+
+    def test_partial_trailing_line(self):
+        with open(self.path, 'wb') as f:
+            f.write(entry(0, 0, 'INFO', 'a'))
+            f.write(entry(1, 0, 'INFO', 'b')[:10])
+
+        index = FileIndex()
+        self._update(index)
+        assert index.keys == ['2026-10-16 12:00']
+        assert index.size == len(entry(0, 0, 'INFO', 'a'))
+
+        with open(self.path, 'ab') as f:
+            f.write(entry(1, 0, 'INFO', 'b')[10:])
+
+        self._update(index)
+        assert index.keys == ['2026-10-16 12:00', '2026-10-16 12:01']
+        assert index.size == os.path.getsize(self.path)
+
+
+class TestLogIndex(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'info.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write(self, path, lines):
+        with open(path, 'wb') as f:
+            for line in lines:
+                f.write(line)
+
+    def test_rotation_keeps_index(self):
+        self._write(self.path, [entry(0, 0, 'INFO', 'a')])
+
+        index = LogIndex(self.path, backups=2)
+        (name, first), = index.refresh()
+        assert name == self.path
+
+        os.rename(self.path, self.path + '.1')
+        self._write(self.path, [entry(1, 0, 'INFO', 'b')])
+
+        found = index.refresh()
+        assert [n for n, i in found] == [self.path + '.1', self.path]
+        assert found[0][1] is first
+        assert found[1][1] is not first
+
+    def test_truncated_file_reindexed(self):
+        self._write(self.path, [entry(0, 0, 'INFO', 'a'), entry(1, 0, 'INFO', 'b')])
+
+        index = LogIndex(self.path, backups=0)
+        index.refresh()
+
+        self._write(self.path, [entry(5, 0, 'INFO', 'c')])
+        (name, file_index), = index.refresh()
+        assert file_index.keys == ['2026-10-16 12:05']
+
+    def test_search(self):
+        self._write(self.path + '.1', [entry(0, 0, 'INFO', 'zone 1 fault'),
+                                        entry(0, 30, 'ERROR', 'device lost'),
+                                        b'Traceback (most recent call last):\n'])
+        self._write(self.path, [entry(1, 0, 'DEBUG', 'zone 2 fault'),
+                                entry(2, 15, 'WARNING', 'zone 3 fault'),
+                                entry(2, 45, 'INFO', 'armed')])
+
+        index = LogIndex(self.path, backups=2)
+
+        results, truncated = index.search()
+        assert len(results) == 5 and not truncated
+        assert results[1].endswith('Traceback (most recent call last):')
+
+        results, truncated = index.search(level='warning')
+        assert messages(results) == ['device lost', 'zone 3 fault']
+
+        results, truncated = index.search(text='ZONE')
+        assert messages(results) == ['zone 1 fault', 'zone 2 fault', 'zone 3 fault']
+
+        results, truncated = index.search(since='2026-10-16 12:00:30', until='2026-10-16 12:02')
+        assert messages(results) == ['device lost', 'zone 2 fault', 'zone 3 fault', 'armed']
+
+        results, truncated = index.search(until='2026-10-16 12:02:15')
+        assert messages(results)[-1] == 'zone 3 fault'
+
+        results, truncated = index.search(limit=2)
+        assert truncated
+        assert messages(results) == ['zone 3 fault', 'armed']
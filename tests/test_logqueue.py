@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from ad2web.logqueue import QueueHandler
+
+
+class TestQueueHandler(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'info.log')
+
+        self.target = logging.FileHandler(self.path)
+        self.target.setFormatter(logging.Formatter('%(message)s'))
+
+        self.logger = logging.getLogger('test_logqueue')
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.handlers = []
+        shutil.rmtree(self.folder)
+
+    def test_close_drains_queue(self):
+        handler = QueueHandler(self.target, max_pending=1000)
+        self.logger.addHandler(handler)
+
+        for i in range(100):
+            self.logger.warning('record %d', i)
+
+        handler.close()
+
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+
+        assert lines == ['record {0}'.format(i) for i in range(100)]
+        assert handler.stats() == {'pending': 0, 'written': 100, 'dropped': 0}
+        assert self.target.stream is None
+
+        # A second close doesn't wait on a writer that's already gone.
+        handler.close()
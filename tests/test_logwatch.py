@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from unittest import TestCase, skipUnless
+
+from ad2web import logwatch
+from ad2web.logwatch import LogWatcher, Inotify
+from ad2web.log.live import LogTail
+
+
+class TestTail(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'info.log')
+
+        # info.log.2 holds lines 0-99, info.log.1 100-199, info.log 200-249.
+        self._write(self.path + '.2', range(0, 100))
+        self._write(self.path + '.1', range(100, 200))
+        self._write(self.path, range(200, 250))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write(self, path, numbers):
+        with open(path, 'wb') as f:
+            for i in numbers:
+                f.write(b'line ' + str(i).encode('ascii') + b' ' + b'x' * 100 + b'\n')
+
+    def _numbers(self, lines):
+        return [int(l.split()[1]) for l in lines]
+
+    def test_tail(self):
+        lines = LogWatcher.tail(self.path, 10)
+        assert self._numbers(lines) == list(range(240, 250))
+
+    def test_tail_whole_file(self):
+        lines = LogWatcher.tail(self.path, 1000)
+        assert self._numbers(lines) == list(range(200, 250))
+
+    def test_tail_rotated(self):
+        lines = LogWatcher.tail(self.path, 120, rotated=10)
+        assert self._numbers(lines) == list(range(130, 250))
+
+        lines = LogWatcher.tail(self.path, 1000, rotated=10)
+        assert self._numbers(lines) == list(range(0, 250))
+
+    def test_tail_invalid_window(self):
+        self.assertRaises(ValueError, LogWatcher.tail, self.path, 0)
+
+
+class QuietLogWatcher(LogWatcher):
+
+    def __init__(self, *args, **kwargs):
+        self.messages = []
+        LogWatcher.__init__(self, *args, **kwargs)
+
+    def log(self, line):
+        self.messages.append(line)
+
+
+class FakeDecoder(object):
+
+    def __init__(self):
+        self.websocket = self
+        self.sockets = {}
+        self.app = self
+        self.logger = self
+        self.errors = []
+
+    def error(self, message, **kwargs):
+        self.errors.append(message)
+
+
+class TestLoop(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'info.log')
+        self.lines = []
+        self.thread = None
+
+        self._append(self.path, b'old\n')
+
+    def tearDown(self):
+        if self.thread is not None:
+            self.watcher.close()
+            self.thread.join(5)
+
+        shutil.rmtree(self.folder)
+
+    def _append(self, path, data):
+        with open(path, 'ab') as f:
+            f.write(data)
+
+    def _callback(self, filename, lines):
+        self.lines.extend(l.strip() for l in lines)
+
+    def _start(self, **kwargs):
+        self.watcher = QuietLogWatcher(self.folder, self._callback, **kwargs)
+        self.thread = threading.Thread(target=self.watcher.loop, kwargs={'interval': 0.01})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _wait_for(self, predicate, timeout=5):
+        end = time.time() + timeout
+        while not predicate() and time.time() < end:
+            time.sleep(0.01)
+
+        return predicate()
+
+    @skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+    def test_inotify_rotation(self):
+        self._start()
+        assert self._wait_for(lambda: self.watcher._inotify is not None)
+
+        self._append(self.path, b'one\ntwo\n')
+        assert self._wait_for(lambda: self.lines == [b'one', b'two'])
+
+        # Rotate the way RotatingFileHandler does, with a line written
+        # just before the rename.
+        self._append(self.path, b'three\n')
+        os.rename(self.path, self.path + '.1')
+        self._append(self.path, b'four\n')
+
+        assert self._wait_for(lambda: self.lines == [b'one', b'two', b'three', b'four'])
+
+        self._append(self.path, b'five\n')
+        assert self._wait_for(lambda: self.lines[-1:] == [b'five'])
+        assert self.lines == [b'one', b'two', b'three', b'four', b'five']
+
+    def test_polling_fallback(self):
+        def unavailable():
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        inotify, logwatch.Inotify = logwatch.Inotify, unavailable
+        try:
+            self._start()
+            assert self._wait_for(lambda: any('polling instead' in m for m in self.watcher.messages))
+        finally:
+            logwatch.Inotify = inotify
+
+        assert self.watcher._inotify is None
+
+        self._append(self.path, b'one\n')
+        assert self._wait_for(lambda: self.lines == [b'one'])
+
+    def test_close_before_loop(self):
+        watcher = QuietLogWatcher(self.folder, self._callback)
+        watcher.close()
+
+        thread = threading.Thread(target=watcher.loop)
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+
+    @skipUnless(sys.platform.startswith('linux'), 'inotify is Linux only')
+    def test_close_before_inotify_published(self):
+        watcher = QuietLogWatcher(self.folder, self._callback)
+        inotify = Inotify()
+        watcher.close()
+
+        thread = threading.Thread(target=watcher._inotify_loop, args=(inotify,))
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+
+    def test_tail_stopped_before_run(self):
+        decoder = FakeDecoder()
+        tail = LogTail(decoder, self.path)
+        tail.stop()
+        tail.start()
+        tail.join(5)
+        assert not tail.is_alive()
+        assert decoder.errors == []
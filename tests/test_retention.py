@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from flask import Flask
+from flask.ext.testing import TestCase
+
+from ad2web.config import TestConfig
+from ad2web.extensions import db
+from ad2web.log.models import EventLogEntry
+from ad2web.log.retention import delete_entries
+
+
+class TestDeleteEntries(TestCase):
+
+    def create_app(self):
+        app = Flask(__name__)
+        app.config.from_object(TestConfig)
+        db.init_app(app)
+
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+        for i in range(5):
+            db.session.add(EventLogEntry(type=1, message='event {0}'.format(i)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_archive_after_commit(self):
+        archived = []
+
+        def archive(entries):
+            # Nothing in the chunk is left in the table by now.
+            ids = [e.id for e in entries]
+            assert EventLogEntry.query.filter(EventLogEntry.id.in_(ids)).count() == 0
+            archived.extend(e.as_dict()['message'] for e in entries)
+
+        deleted = delete_entries([EventLogEntry.id > 1], chunk_size=2, pause=0, archive=archive)
+
+        assert deleted == 4
+        assert archived == ['event 1', 'event 2', 'event 3', 'event 4']
+        assert [e.message for e in EventLogEntry.query] == ['event 0']
+
+    def test_failed_delete_not_archived(self):
+        archived = []
+
+        def commit():
+            raise RuntimeError('disk full')
+
+        session_commit, db.session.commit = db.session.commit, commit
+        try:
+            self.assertRaises(RuntimeError, delete_entries, chunk_size=2, pause=0, archive=archived.extend)
+        finally:
+            db.session.commit = session_commit
+
+        assert archived == []
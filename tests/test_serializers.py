@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import json
+import datetime
+from unittest import TestCase
+
+import jsonpickle
+from alarmdecoder.messages import Message, LRRMessage, RFMessage, ExpanderMessage
+
+from ad2web import serializers
+
+
+class TestSerializers(TestCase):
+
+    def test_matches_jsonpickle(self):
+        messages = [
+            Message('[0000000110000000----],010,[f70000051010000c18020000000000],"DISARMED CHIME   Ready to Arm  "'),
+            LRRMessage('!LRR:012,1,CID_1441'),
+            RFMessage('!RFX:0180036,80'),
+            ExpanderMessage('!EXP:07,01,01'),
+        ]
+
+        for message in messages:
+            data = {'message': message, 'message_type': 'panel'}
+
+            expected = json.loads(jsonpickle.encode(data, unpicklable=False))
+            expected['message'].pop('_regex', None)
+
+            self.assertEqual(json.loads(serializers.encode(data)), expected)
+
+    def test_fallback(self):
+        class Thing(object):
+            def __init__(self):
+                self.when = datetime.datetime(2014, 1, 2, 3, 4, 5)
+                self.zones = (1, 2)
+
+        self.assertEqual(json.loads(serializers.encode(Thing())),
+                         {'when': '2014-01-02 03:04:05', 'zones': [1, 2]})
+
+    def test_compact_message(self):
+        message = Message('[1000000110000000----],010,[f70000051010000c18020000000000],"DISARMED CHIME   Ready to Arm  "')
+
+        packed = serializers.compact('message', {'message': message, 'message_type': 'panel'})
+        self.assertEqual(packed[0], serializers.MESSAGE_KINDS.index('panel'))
+        self.assertEqual(packed[2:], [0, '010', 'DISARMED CHIME   Ready to Arm  '])
+
+        bits = dict((name, bool(packed[1] & (1 << i))) for i, name in enumerate(serializers.PANEL_STATUS_BITS))
+        self.assertEqual(bits, dict((name, getattr(message, name)) for name in serializers.PANEL_STATUS_BITS))
+
+        self.assertEqual(serializers.compact('message', {'message_type': 'rfx', 'heartbeat': True, 'repeats': 3}),
+                         [serializers.HEARTBEAT_KIND, 2, 3])
+        self.assertEqual(serializers.compact('event', {'zone': 5}), {'zone': 5})
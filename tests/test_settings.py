@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from flask import Flask
+from flask.ext.testing import TestCase
+
+from ad2web.config import TestConfig
+from ad2web.extensions import db
+from ad2web.settings.models import Setting, settings_cache
+
+
+class TestSettingsCache(TestCase):
+
+    def create_app(self):
+        # A bare app, so no decoder threads load settings during the tests.
+        app = Flask(__name__)
+        app.config.from_object(TestConfig)
+        db.init_app(app)
+
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+        settings_cache.invalidate()
+        settings_cache.hits = settings_cache.misses = 0
+
+        db.session.add(Setting(name='device_path', string_value='/dev/ttyAMA0'))
+        db.session.add(Setting(name='device_port', int_value=10000))
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def _set(self, name, value):
+        setting = Setting.get_by_name(name)
+        setting.value = value
+        db.session.add(setting)
+
+    def test_hits_and_misses(self):
+        assert Setting.get_by_name('device_path').value == '/dev/ttyAMA0'
+        assert Setting.get_by_name('device_port').value == 10000
+        assert Setting.get_by_name('missing', default=5).value == 5
+
+        stats = settings_cache.stats()
+        assert stats['loaded']
+        assert stats['misses'] == 1
+        assert stats['hits'] == 2
+
+    def test_reads_after_commit(self):
+        assert Setting.get_by_name('device_path').value == '/dev/ttyAMA0'
+
+        self._set('device_path', '/dev/ttyUSB0')
+        db.session.commit()
+        assert not settings_cache.stats()['loaded']
+
+        db.session.expunge_all()
+        assert Setting.get_by_name('device_path').value == '/dev/ttyUSB0'
+        assert settings_cache.stats()['misses'] == 2
+
+    def test_pending_setting(self):
+        setting = Setting(name='use_ssl', int_value=1)
+        db.session.add(setting)
+
+        assert Setting.get_by_name('use_ssl') is setting
+
+    def test_flushed_changes_not_shared(self):
+        self._set('device_path', '/dev/ttyUSB0')
+        db.session.flush()
+
+        assert Setting.get_by_name('device_path').value == '/dev/ttyUSB0'
+        assert not settings_cache.stats()['loaded']
+
+        db.session.rollback()
+        db.session.expunge_all()
+        assert Setting.get_by_name('device_path').value == '/dev/ttyAMA0'
+        assert settings_cache.stats()['loaded']
+
+    def test_bulk_delete(self):
+        assert Setting.get_by_name('device_path').value == '/dev/ttyAMA0'
+
+        # The same steps the backup import takes.
+        Setting.query.delete()
+        db.session.add(Setting(name='device_path', string_value='/dev/ttyS0'))
+        db.session.commit()
+        db.session.expunge_all()
+
+        assert Setting.get_by_name('device_path').value == '/dev/ttyS0'
+        assert Setting.get_by_name('device_port').value is None
+
+    def test_bulk_update(self):
+        assert Setting.get_by_name('device_port').value == 10000
+
+        Setting.query.filter_by(name='device_port').update({'int_value': 10001}, synchronize_session=False)
+        assert not settings_cache.stats()['loaded']
+
+        db.session.commit()
+        db.session.expunge_all()
+        assert Setting.get_by_name('device_port').value == 10001
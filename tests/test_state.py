@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from ad2web.state import PanelState
+from ad2web.notifications.constants import ARM, DISARM, ZONE_FAULT, ZONE_RESTORE, LOW_BATTERY
+
+
+class TestPanelState(TestCase):
+
+    def test_version_only_changes_with_state(self):
+        state = PanelState()
+        version = state.version
+
+        state.update_event(ARM)
+        self.assertEqual(state.version, version + 1)
+
+        state.update_event(ARM)
+        self.assertEqual(state.version, version + 1)
+
+        state.update_event(DISARM)
+        self.assertEqual(state.version, version + 2)
+        self.assertFalse(state.snapshot()['armed'])
+
+    def test_faulted_zones(self):
+        state = PanelState()
+
+        state.update_event(ZONE_FAULT, zone=12)
+        state.update_event(ZONE_FAULT, zone=3)
+        snapshot = state.snapshot()
+        self.assertEqual(snapshot['faulted_zones'], [3, 12])
+
+        state.update_event(ZONE_RESTORE, zone=12)
+        self.assertEqual(state.snapshot()['faulted_zones'], [3])
+        self.assertEqual(snapshot['faulted_zones'], [3, 12])
+
+    def test_etag_follows_version(self):
+        state = PanelState()
+        etag = state.etag()
+
+        state.update_event(LOW_BATTERY, status=True)
+        self.assertNotEqual(state.etag(), etag)
+        self.assertEqual(state.etag(state.snapshot()['version']), state.etag())
+        self.assertNotEqual(PanelState().etag(), PanelState().etag())
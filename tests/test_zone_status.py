@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+
+from ad2web.zones.status import ZoneStatusTable
+
+
+class TestZoneStatusTable(TestCase):
+
+    def test_fault_and_restore(self):
+        table = ZoneStatusTable(max_zones=16)
+
+        diff = table.fault(5, timestamp=10.0)
+        self.assertEqual(diff, {'since': 0, 'version': 1, 'zones': [(5, True, 10.0, None, 1)]})
+        self.assertIsNone(table.fault(5, timestamp=11.0))
+
+        diff = table.restore('5', timestamp=12.0)
+        self.assertEqual(diff['zones'], [(5, False, 10.0, 12.0, 1)])
+
+        self.assertIsNone(table.fault(17))
+        self.assertIsNone(table.restore(None))
+
+    def test_rows_since(self):
+        table = ZoneStatusTable(max_zones=128)
+        table.fault(1)
+        table.fault(100)
+        version = table.version
+        table.fault(64)
+        table.restore(1)
+
+        self.assertEqual([r[0] for r in table.rows()[1]], [1, 64, 100])
+        self.assertEqual([r[0] for r in table.rows(since=version)[1]], [1, 64])
+
+    def test_clear(self):
+        table = ZoneStatusTable(max_zones=16)
+        table.fault(2)
+        table.fault(3)
+
+        diff = table.clear()
+        self.assertEqual(diff['since'], 2)
+        self.assertEqual([(r[0], r[1]) for r in diff['zones']], [(2, False), (3, False)])
+        self.assertIsNone(table.clear())